@@ -718,6 +718,30 @@ CREATE FUNCTION pgbouncer.get_auth(p_usename text) RETURNS TABLE(username text,
   $_$;
 
 
+--
+-- Name: properties_count_rows(); Type: FUNCTION; Schema: public; Owner: -
+--
+
+CREATE FUNCTION public.properties_count_rows() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE public.websites w
+        SET property_count = w.property_count + d.n
+        FROM (SELECT website_id, COUNT(*) AS n FROM new_rows GROUP BY website_id) d
+        WHERE w.id = d.website_id;
+    ELSE
+        UPDATE public.websites w
+        SET property_count = GREATEST(w.property_count - d.n, 0)
+        FROM (SELECT website_id, COUNT(*) AS n FROM old_rows GROUP BY website_id) d
+        WHERE w.id = d.website_id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+
 --
 -- Name: apply_rls(jsonb, integer); Type: FUNCTION; Schema: realtime; Owner: -
 --
@@ -3124,6 +3148,25 @@ CREATE TABLE public.gsc_tokens (
 );
 
 
+--
+-- Name: ingestion_log; Type: TABLE; Schema: public; Owner: -
+--
+
+CREATE TABLE public.ingestion_log (
+    property_id uuid NOT NULL,
+    metric_type text NOT NULL,
+    date date NOT NULL,
+    ingested_at timestamp with time zone DEFAULT now()
+);
+
+
+--
+-- Name: TABLE ingestion_log; Type: COMMENT; Schema: public; Owner: -
+--
+
+COMMENT ON TABLE public.ingestion_log IS 'One row per (property, metric type, day) whose GSC fetch was fully committed';
+
+
 --
 -- Name: page_daily_metrics; Type: TABLE; Schema: public; Owner: -
 --
@@ -3137,7 +3180,8 @@ CREATE TABLE public.page_daily_metrics (
     impressions integer DEFAULT 0 NOT NULL,
     created_at timestamp with time zone DEFAULT now(),
     updated_at timestamp with time zone DEFAULT now()
-);
+)
+WITH (fillfactor='90');
 
 
 --
@@ -3207,7 +3251,8 @@ CREATE TABLE public.websites (
     base_domain text NOT NULL,
     display_name text NOT NULL,
     created_at timestamp with time zone DEFAULT now(),
-    account_id uuid NOT NULL
+    account_id uuid NOT NULL,
+    property_count integer DEFAULT 0 NOT NULL
 );
 
 
@@ -3756,6 +3801,14 @@ ALTER TABLE ONLY public.gsc_tokens
     ADD CONSTRAINT gsc_tokens_pkey PRIMARY KEY (account_id);
 
 
+--
+-- Name: ingestion_log ingestion_log_pkey; Type: CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.ingestion_log
+    ADD CONSTRAINT ingestion_log_pkey PRIMARY KEY (property_id, metric_type, date);
+
+
 --
 -- Name: page_daily_metrics page_daily_metrics_pkey; Type: CONSTRAINT; Schema: public; Owner: -
 --
@@ -4285,14 +4338,21 @@ CREATE INDEX idx_alerts_account ON public.alerts USING btree (account_id);
 -- Name: idx_alerts_account_triggered; Type: INDEX; Schema: public; Owner: -
 --
 
-CREATE INDEX idx_alerts_account_triggered ON public.alerts USING btree (account_id, triggered_at DESC);
+CREATE INDEX idx_alerts_account_triggered ON public.alerts USING btree (account_id, triggered_at DESC) INCLUDE (id, property_id, alert_type, prev_7_impressions, last_7_impressions, delta_pct, email_sent);
 
 
 --
 -- Name: idx_alerts_dedup; Type: INDEX; Schema: public; Owner: -
 --
 
-CREATE INDEX idx_alerts_dedup ON public.alerts USING btree (account_id, property_id, alert_type, triggered_at DESC);
+CREATE INDEX idx_alerts_dedup ON public.alerts USING btree (account_id, property_id, alert_type, triggered_at DESC) INCLUDE (id);
+
+
+--
+-- Name: idx_alerts_pending; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX idx_alerts_pending ON public.alerts USING btree (triggered_at) WHERE (email_sent = false);
 
 
 --
@@ -4331,10 +4391,10 @@ CREATE INDEX idx_page_property_date ON public.page_daily_metrics USING btree (pr
 
 
 --
--- Name: idx_pipeline_runs_account; Type: INDEX; Schema: public; Owner: -
+-- Name: idx_pipeline_runs_account_updated; Type: INDEX; Schema: public; Owner: -
 --
 
-CREATE INDEX idx_pipeline_runs_account ON public.pipeline_runs USING btree (account_id);
+CREATE INDEX idx_pipeline_runs_account_updated ON public.pipeline_runs USING btree (account_id, updated_at DESC);
 
 
 --
@@ -4348,7 +4408,7 @@ CREATE INDEX idx_properties_account ON public.properties USING btree (account_id
 -- Name: idx_property_metrics_property_date; Type: INDEX; Schema: public; Owner: -
 --
 
-CREATE INDEX idx_property_metrics_property_date ON public.property_daily_metrics USING btree (property_id, date DESC);
+CREATE INDEX idx_property_metrics_property_date ON public.property_daily_metrics USING btree (property_id, date DESC) INCLUDE (clicks, impressions, ctr, position);
 
 
 --
@@ -4477,6 +4537,20 @@ CREATE INDEX name_prefix_search ON storage.objects USING btree (name text_patter
 CREATE UNIQUE INDEX vector_indexes_name_bucket_id_idx ON storage.vector_indexes USING btree (name, bucket_id);
 
 
+--
+-- Name: properties properties_count_delete; Type: TRIGGER; Schema: public; Owner: -
+--
+
+CREATE TRIGGER properties_count_delete AFTER DELETE ON public.properties REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION public.properties_count_rows();
+
+
+--
+-- Name: properties properties_count_insert; Type: TRIGGER; Schema: public; Owner: -
+--
+
+CREATE TRIGGER properties_count_insert AFTER INSERT ON public.properties REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION public.properties_count_rows();
+
+
 --
 -- Name: subscription tr_check_filters; Type: TRIGGER; Schema: realtime; Owner: -
 --
@@ -4712,6 +4786,14 @@ ALTER TABLE ONLY public.gsc_tokens
     ADD CONSTRAINT gsc_tokens_account_id_fkey FOREIGN KEY (account_id) REFERENCES public.accounts(id) ON DELETE CASCADE;
 
 
+--
+-- Name: ingestion_log ingestion_log_property_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.ingestion_log
+    ADD CONSTRAINT ingestion_log_property_id_fkey FOREIGN KEY (property_id) REFERENCES public.properties(id) ON DELETE CASCADE;
+
+
 --
 -- Name: page_daily_metrics page_daily_metrics_property_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
 --
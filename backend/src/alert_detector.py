@@ -14,7 +14,6 @@ Logic:
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 from src.utils.metrics import safe_delta_pct
-from src.utils.windows import get_most_recent_date, split_rows_by_window, aggregate_metrics
 
 
 def log_alert(message: str):
@@ -23,38 +22,25 @@ def log_alert(message: str):
     print(f"[{timestamp}] [ALERT] {message}")
 
 
-def compute_7v7_comparison(account_id: str, property_id: str, db) -> Optional[Dict[str, Any]]:
+def compute_7v7_comparison(property_id: str, site_url: str, window: Optional[Dict[str, int]]) -> Optional[Dict[str, Any]]:
     """
     Compute 7-day vs previous 7-day comparison for a property.
-    Uses centralized window and aggregation utilities.
+    Window sums are aggregated in SQL by db.compute_impression_deltas.
     
     Args:
-        account_id: UUID of the account
         property_id: UUID of the property
-        db: DatabasePersistence instance
+        site_url: Property URL (for logging)
+        window: Dict with 'prev_7_impressions' and 'last_7_impressions'
     
     Returns:
         Dict with: property_id, site_url, prev_7_impressions, last_7_impressions, delta_pct
         None if no metrics available
     """
-    metrics = db.fetch_property_daily_metrics_for_overview(account_id, property_id)
-    
-    if not metrics:
+    if not window:
         return None
     
-    # Get property URL for logging
-    site_url = db.fetch_property_url(property_id)
-    
-    # 🟢 Use Centralized Window logic
-    most_recent_date = get_most_recent_date(metrics)
-    last_rows, prev_rows = split_rows_by_window(metrics, most_recent_date)
-    
-    # 🟢 Use Centralized Aggregation
-    last_agg = aggregate_metrics(last_rows)
-    prev_agg = aggregate_metrics(prev_rows)
-    
-    last_7_impressions = last_agg["impressions"]
-    prev_7_impressions = prev_agg["impressions"]
+    last_7_impressions = window["last_7_impressions"]
+    prev_7_impressions = window["prev_7_impressions"]
     
     # 🟢 Use Centralized Delta Logic
     delta_pct = safe_delta_pct(last_7_impressions, prev_7_impressions)
@@ -96,20 +82,29 @@ def should_trigger_alert(comparison: Dict[str, Any]) -> bool:
     return False
 
 
-def detect_alert_for_property(account_id: str, property_id: str, db) -> Optional[str]:
+def evaluate_alert_for_property(
+    account_id: str,
+    prop: Dict[str, Any],
+    window: Optional[Dict[str, int]],
+    db
+) -> Optional[Dict[str, Any]]:
     """
-    Detect alert for a single property with explicit logging and deduplication.
+    Evaluate a single property with explicit logging and deduplication.
+    Does not write; triggered alerts are inserted in bulk by the caller.
     
     Args:
         account_id: UUID of the account
-        property_id: UUID of the property
-        db: DatabasePersistence instance
+        prop: Property dict with 'id' and 'site_url'
+        window: The property's last_7 / prev_7 impression sums
+        db: DatabasePersistence instance (deduplication lookup)
     
     Returns:
-        Alert UUID if triggered, None otherwise
+        Alert row (insert_alerts_bulk format) if triggered, None otherwise
     """
+    property_id = prop['id']
+    
     # Compute 7v7 comparison
-    comparison = compute_7v7_comparison(account_id, property_id, db)
+    comparison = compute_7v7_comparison(property_id, prop['site_url'], window)
     
     if not comparison:
         return None
@@ -136,17 +131,14 @@ def detect_alert_for_property(account_id: str, property_id: str, db) -> Optional
 
         log_alert(f"✅ Triggered (delta={delta_pct:+.1f}%)")
         
-        # Insert alert into database
-        alert_id = db.insert_alert(
-            account_id=account_id,
-            property_id=property_id,
-            alert_type="impression_drop",
-            prev_7_impressions=prev_7,
-            last_7_impressions=last_7,
-            delta_pct=delta_pct
-        )
-        
-        return alert_id
+        return {
+            "account_id": account_id,
+            "property_id": property_id,
+            "alert_type": "impression_drop",
+            "prev_7_impressions": prev_7,
+            "last_7_impressions": last_7,
+            "delta_pct": delta_pct
+        }
     else:
         # Determine why it didn't trigger
         if prev_7 < 100:
@@ -177,16 +169,21 @@ def detect_alerts_for_all_properties(db, account_id: str) -> int:
     properties = db.fetch_all_properties(account_id)
     log_alert(f"Evaluating {len(properties)} properties")
     
-    triggered_count = 0
+    # 7v7 sums for every property, aggregated in one SQL pass
+    windows_by_prop = db.compute_impression_deltas(account_id)
+    
+    triggered = []
     
     for prop in properties:
-        property_id = prop['id']
-        
-        # Detect alert for this property
-        alert_id = detect_alert_for_property(account_id, property_id, db)
+        # Evaluate this property
+        alert_row = evaluate_alert_for_property(account_id, prop, windows_by_prop.get(prop['id']), db)
         
-        if alert_id:
-            triggered_count += 1
+        if alert_row:
+            triggered.append(alert_row)
+    
+    # Insert all triggered alerts in one round-trip
+    alert_ids = db.insert_alerts_bulk(triggered)
+    triggered_count = len(alert_ids)
     
     log_alert(f"Alert detection complete: {triggered_count} alerts triggered")
     log_alert(f"Alerts inserted into database with email_sent = false")
@@ -6,17 +6,17 @@ Transactional Email via SendGrid API
 """
 
 import os
+import threading
 import time
 import traceback
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 from typing import List, Dict, Any, Optional
 
 # SendGrid SDK
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
-
-# Windows/Metrics Utilities
-from src.utils.windows import get_most_recent_date
+from python_http_client.exceptions import HTTPError
 
 from src.settings import settings
 
@@ -26,6 +26,19 @@ from src.settings import settings
 # the alert's triggered_at, so cron delays don't erode the window.
 COOLDOWN_DAYS = 3
 
+# Concurrent SendGrid requests per account (HTTP only; DB work stays serial)
+SEND_WORKERS = 8
+
+# Statuses for which a multi-recipient send is retried one recipient at a
+# time: SendGrid rejects the whole request over one invalid address. Other
+# 4xx (429 throttling, 401/403 bad key, 413) would fail again for everyone.
+SPLIT_RETRY_STATUSES = {400, 422}
+
+# SendGrid request rate across all send workers (~2 requests/second)
+SEND_MIN_INTERVAL_SECONDS = 0.5
+_send_rate_lock = threading.Lock()
+_last_send_at = 0.0
+
 
 def log_dispatcher(message: str, account_email: Optional[str] = None):
     """Log dispatcher messages with timestamp and account context"""
@@ -125,30 +138,79 @@ def create_sendgrid_message(ctx: Dict[str, Any], recipients: List[str]) -> Mail:
     plain_text = generate_plain_text(ctx)
     html_content = generate_html_email(ctx)
     
+    # is_multiple: one personalization per recipient, so each gets a
+    # separate email and never sees the other addresses
     message = Mail(
         from_email=settings.SENDGRID_FROM_EMAIL,
         to_emails=recipients,
         subject=subject,
         plain_text_content=plain_text,
-        html_content=html_content
+        html_content=html_content,
+        is_multiple=True
     )
     return message
 
 
+def wait_for_send_slot() -> None:
+    """
+    Block until SEND_MIN_INTERVAL_SECONDS have passed since the previous
+    SendGrid request from any worker. Waiting happens under the lock, so
+    workers leave one interval apart however many there are.
+    """
+    global _last_send_at
+    with _send_rate_lock:
+        wait = _last_send_at + SEND_MIN_INTERVAL_SECONDS - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        _last_send_at = time.monotonic()
+
+
+def send_message(sg: SendGridAPIClient, ctx: Dict[str, Any], recipients: List[str]) -> int:
+    """
+    One rate-limited SendGrid request; returns its status code. The client
+    raises on 4xx/5xx, so those come back as their status code too.
+    """
+    wait_for_send_slot()
+    try:
+        return sg.send(create_sendgrid_message(ctx, recipients)).status_code
+    except HTTPError as e:
+        return e.status_code
+
+
+def send_alert_email(sg: SendGridAPIClient, ctx: Dict[str, Any], recipients: List[str]) -> Dict[str, int]:
+    """
+    Send one alert to its recipients and return the SendGrid status code
+    per recipient. Touches no DB state, so it is safe to run on a worker thread.
+    
+    A 400/422 on the combined request rejects every personalization, often
+    because of one bad address, so each recipient is then retried alone.
+    Any other failure leaves every recipient unsent for the next cron run.
+    """
+    status_code = send_message(sg, ctx, recipients)
+    if status_code in SPLIT_RETRY_STATUSES and len(recipients) > 1:
+        return {email: send_message(sg, ctx, [email]) for email in recipients}
+    return {email: status_code for email in recipients}
+
+
 def dispatch_pending_alerts(db) -> Dict[str, int]:
     """
     Dispatcher - Iterates through all accounts and sends pending alerts via SendGrid API.
     
     Flow per alert:
-      1. Fetch property-level subscribers
+      1. Look up property-level subscribers (prefetched for all of an
+         account's pending alerts in one query)
       2. Zero-subscriber guard: mark email_sent=True and skip
       3. Insert delivery rows (idempotent)
       4. Fetch unsent deliveries (authoritative list, FOR UPDATE SKIP LOCKED)
-      5. For each unsent delivery:
+      5. For the unsent deliveries:
          a. Check per-recipient 3-day cooldown → suppress if in cooldown
-         b. Send via SendGrid on 202 → mark sent
+         b. Send the rest in one SendGrid request (one personalization
+            per recipient) → on 202 mark them all sent; on a 400/422 retry each
+            recipient alone and mark only the accepted ones sent. An account's
+            requests run on a small thread pool so their round-trips overlap.
          c. Leave unsent on failure → cron retries
       6. Close alert if all deliveries sent or suppressed
+         (completed alerts are flagged in one batch per account)
     """
     log_dispatcher("Starting multi-account alert dispatcher (SendGrid Mode)")
     
@@ -178,13 +240,33 @@ def dispatch_pending_alerts(db) -> Dict[str, int]:
 
             log_dispatcher(f"Found {len(pending)} pending alert(s) to dispatch", account_email)
 
+            # Alerts to close; flagged together in one UPDATE once the account is done
+            completed_alert_ids = []
+            # (alert_id, ctx, deliveries, their emails) still to email after the cooldown filter
+            send_jobs = []
+            # (property_id, email) already queued by an earlier alert this run.
+            # Sends happen only in STEP 7, so is_recipient_in_cooldown cannot
+            # see them yet; without this, two alerts for one property both pass.
+            claimed_recipients = set()
+
+            # Subscribers and week anchors for every pending alert, in two queries
+            pending_property_ids = list({alert['property_id'] for alert in pending})
+            try:
+                subscribers_by_property = db.fetch_subscribers_for_properties(account_id, pending_property_ids)
+                latest_dates = db.fetch_latest_metric_dates(account_id, pending_property_ids)
+            except Exception:
+                log_dispatcher("❌ Failed to prefetch subscribers — skipping account this run", account_email)
+                log_dispatcher(traceback.format_exc())
+                failed_count += len(pending)
+                continue
+
             for alert in pending:
                 alert_id = alert['id']
                 property_id = alert['property_id']
 
                 try:
                     # ── STEP 1: Fetch property-level subscribers ──────────────────
-                    subscribers = db.fetch_property_subscribers(account_id, property_id)
+                    subscribers = subscribers_by_property.get(property_id, [])
 
                     # ── STEP 2: Zero-subscriber guard ─────────────────────────────
                     # If no one is subscribed, mark alert complete immediately.
@@ -195,18 +277,16 @@ def dispatch_pending_alerts(db) -> Dict[str, int]:
                             f"(alert_id={alert_id}) — marking complete (no email sent)",
                             account_email
                         )
-                        db.mark_alert_email_sent(alert_id)
+                        completed_alert_ids.append(alert_id)
                         continue
 
                     # ── STEP 3: Data enrichment ───────────────────────────────────
-                    property_meta = db.fetch_property_by_id(account_id, property_id)
-                    property_name = property_meta.get('property_name') if property_meta else alert['site_url']
-                    if not property_name:
-                        property_name = alert['site_url'].replace("https://", "").replace("http://", "").rstrip("/")
-
-                    # Fetch raw metrics for precise week ranges
-                    metrics = db.fetch_property_daily_metrics_for_overview(account_id, property_id)
-                    most_recent_date = get_most_recent_date(metrics)
+                    # site_url already comes with the pending alert (joined on
+                    # properties), so the display name needs no extra lookup
+                    property_name = alert['site_url'].replace("https://", "").replace("http://", "").rstrip("/")
+
+                    # Precise week ranges, anchored to the latest ingested date
+                    most_recent_date = latest_dates.get(property_id) or date.today()
                     
                     last_7_start = most_recent_date - timedelta(days=6)
                     prev_7_start = most_recent_date - timedelta(days=13)
@@ -238,7 +318,7 @@ def dispatch_pending_alerts(db) -> Dict[str, int]:
                     if not unsent:
                         # All deliveries already sent/suppressed from a prior cron run
                         log_dispatcher(f"All deliveries already closed for alert {alert_id}", account_email)
-                        db.mark_alert_email_sent(alert_id)
+                        completed_alert_ids.append(alert_id)
                         continue
 
                     log_dispatcher(
@@ -246,20 +326,22 @@ def dispatch_pending_alerts(db) -> Dict[str, int]:
                         account_email
                     )
 
-                    # ── STEP 6: Send one email per delivery (cooldown-aware) ───────
+                    # ── STEP 6: Cooldown filter; the send is queued for STEP 7 ─────
+                    to_send = []
+                    suppressed_ids = []
                     for delivery in unsent:
                         delivery_id = delivery['id']
                         recipient_email = delivery['email']
                         try:
                             # Per-recipient cooldown check.
                             # If this recipient received a real email for this property
-                            # within the last COOLDOWN_DAYS, suppress (don't send).
-                            # mark_delivery_suppressed() sets sent=true so closure works.
-                            if db.is_recipient_in_cooldown(
+                            # within the last COOLDOWN_DAYS, or is already queued for it
+                            # by an earlier alert this run, suppress (don't send).
+                            # mark_deliveries_suppressed() sets sent=true so closure works.
+                            if (property_id, recipient_email) in claimed_recipients or db.is_recipient_in_cooldown(
                                 alert_id, recipient_email, account_id, property_id, COOLDOWN_DAYS
                             ):
-                                db.mark_delivery_suppressed(delivery_id)
-                                suppressed_count += 1
+                                suppressed_ids.append(delivery_id)
                                 log_dispatcher(
                                     f"⏭  Suppressed ({COOLDOWN_DAYS}-day cooldown) "
                                     f"→ {recipient_email} [delivery: {delivery_id}]",
@@ -267,32 +349,26 @@ def dispatch_pending_alerts(db) -> Dict[str, int]:
                                 )
                                 continue
 
-                            mail = create_sendgrid_message(ctx, [recipient_email])
-                            response = sg.send(mail)
-
-                            if response.status_code == 202:
-                                # Success: mark this delivery as sent
-                                db.mark_delivery_sent(delivery_id)
-                                sent_count += 1
-                                log_dispatcher(f"✅ [SENDGRID] 202 → {recipient_email}", account_email)
-                            else:
-                                # Failure: leave sent=false, cron will retry
-                                log_dispatcher(
-                                    f"❌ [SENDGRID] {response.status_code} → {recipient_email}",
-                                    account_email
-                                )
-                                failed_count += 1
-
-                            time.sleep(0.5)  # API rate limit throttle
+                            to_send.append(delivery)
+                            claimed_recipients.add((property_id, recipient_email))
 
                         except Exception:
-                            log_dispatcher(f"❌ [SENDGRID] Exception sending to {recipient_email}", account_email)
+                            log_dispatcher(f"❌ Cooldown check failed for {recipient_email}", account_email)
                             log_dispatcher(traceback.format_exc())
                             failed_count += 1
 
-                    # ── STEP 7: Close alert if all deliveries complete ────────────
+                    # All of this alert's suppressions in one UPDATE
+                    if suppressed_ids:
+                        db.mark_deliveries_suppressed(suppressed_ids)
+                        suppressed_count += len(suppressed_ids)
+
+                    if to_send:
+                        send_jobs.append((alert_id, ctx, to_send, [d['email'] for d in to_send]))
+                        continue
+
+                    # Nothing left to send (suppressed or failed checks): close if complete
                     if db.check_if_alert_fully_delivered(alert_id):
-                        db.mark_alert_email_sent(alert_id)
+                        completed_alert_ids.append(alert_id)
                         log_dispatcher(f"✅ Alert {alert_id} fully delivered — marked complete", account_email)
                     else:
                         log_dispatcher(f"⏳ Alert {alert_id} partially delivered — will retry", account_email)
@@ -302,6 +378,61 @@ def dispatch_pending_alerts(db) -> Dict[str, int]:
                     log_dispatcher(traceback.format_exc())
                     failed_count += 1
 
+            # ── STEP 7: Send concurrently, record results on this thread ─────
+            # Workers only talk to SendGrid; every DB write stays on the
+            # dispatcher's own connection, in submission order.
+            if send_jobs:
+                with ThreadPoolExecutor(max_workers=min(SEND_WORKERS, len(send_jobs))) as pool:
+                    futures = [
+                        pool.submit(send_alert_email, sg, ctx, recipient_emails)
+                        for _, ctx, _, recipient_emails in send_jobs
+                    ]
+
+                    for (alert_id, ctx, to_send, recipient_emails), future in zip(send_jobs, futures):
+                        try:
+                            statuses = future.result()
+
+                            # Success: mark the deliveries SendGrid accepted as sent
+                            sent_ids = [d['id'] for d in to_send if statuses[d['email']] == 202]
+                            if sent_ids:
+                                db.mark_deliveries_sent(sent_ids)
+                                sent_count += len(sent_ids)
+
+                            for status_code in sorted(set(statuses.values())):
+                                emails = [email for email in recipient_emails if statuses[email] == status_code]
+                                if status_code == 202:
+                                    log_dispatcher(f"✅ [SENDGRID] 202 → {', '.join(emails)}", account_email)
+                                else:
+                                    # Failure: leave sent=false, cron will retry
+                                    log_dispatcher(f"❌ [SENDGRID] {status_code} → {', '.join(emails)}", account_email)
+                                    failed_count += len(emails)
+
+                        except Exception:
+                            log_dispatcher(f"❌ [SENDGRID] Exception sending to {', '.join(recipient_emails)}", account_email)
+                            log_dispatcher(traceback.format_exc())
+                            failed_count += len(to_send)
+
+                        # Close alert if all deliveries complete
+                        try:
+                            if db.check_if_alert_fully_delivered(alert_id):
+                                completed_alert_ids.append(alert_id)
+                                log_dispatcher(f"✅ Alert {alert_id} fully delivered — marked complete", account_email)
+                            else:
+                                log_dispatcher(f"⏳ Alert {alert_id} partially delivered — will retry", account_email)
+                        except Exception:
+                            log_dispatcher(f"❌ Error closing alert {alert_id}", account_email)
+                            log_dispatcher(traceback.format_exc())
+                            failed_count += 1
+
+            # ── STEP 8: Close completed alerts in one round-trip ──────────────
+            # Deliveries are already committed per recipient, so an alert left
+            # open by a crash here is simply closed again on the next cron run.
+            try:
+                db.mark_alert_emails_sent(completed_alert_ids)
+            except Exception:
+                log_dispatcher(f"❌ Failed to close {len(completed_alert_ids)} completed alert(s)", account_email)
+                log_dispatcher(traceback.format_exc())
+
     except Exception:
         log_dispatcher("❌ [SENDGRID] Fatal SendGrid error occurred")
         log_dispatcher(traceback.format_exc())
@@ -326,7 +457,8 @@ def main():
         from src.db_persistence import DatabasePersistence, init_db_pool, close_db_pool
         
         # Initialize pool for Cron process using centralized settings
-        init_db_pool(settings.DATABASE_URL, minconn=1, maxconn=5)
+        # maxconn=1: all DB work stays on the dispatcher's single connection
+        init_db_pool(settings.DATABASE_URL, minconn=1, maxconn=1)
         
         db = DatabasePersistence()
         db.connect()
@@ -1,15 +1,16 @@
 from __future__ import annotations
 import os
 from contextlib import asynccontextmanager
-from collections import defaultdict
 from fastapi import FastAPI, HTTPException, APIRouter, Depends, Request
-from fastapi.responses import RedirectResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import RedirectResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Dict, List, Any, Optional
 from src.config.date_windows import ANALYSIS_WINDOW_DAYS, HALF_ANALYSIS_WINDOW
 from datetime import datetime
 from decimal import Decimal
 from uuid import UUID
+import asyncio
 import base64
 import json
 
@@ -21,8 +22,10 @@ from src.auth.supabase_auth import get_current_user_id
 from src.main import run_pipeline
 from src.gsc_client import AuthError
 from src.auth_handler import GoogleAuthHandler
-from src.db_persistence import DatabasePersistence, init_db_pool, close_db_pool, get_db
+from src.db_persistence import DatabasePersistence, init_db_pool, close_db_pool, get_db, subscribe_pipeline
 from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 from src.page_visibility_analyzer import PageVisibilityAnalyzer
 from src.device_visibility_analyzer import DeviceVisibilityAnalyzer
 from src.utils.metrics import safe_delta_pct
@@ -33,20 +36,49 @@ from src.utils.windows import get_most_recent_date, split_rows_by_window, aggreg
 # Lifespan
 # -------------------------------------------------------------------------
 
+STALE_RUN_SWEEP_SECONDS = 60
+
+
+def stale_run_reaper(stop_event: threading.Event) -> None:
+    """
+    Terminate stale pipeline runs for all accounts once a minute, so the
+    status endpoint can stay read-only.
+    """
+    while not stop_event.wait(STALE_RUN_SWEEP_SECONDS):
+        db = DatabasePersistence()
+        try:
+            db.connect()
+            db.cleanup_stale_runs()
+        except Exception as e:
+            print(f"[REAPER] Stale run sweep failed: {e}")
+        finally:
+            db.disconnect()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage database connection pool and threading lifecycle."""
     # Initialize global pool using centralized settings
     # maxconn=10: Supabase session-mode pooler hard-limits concurrent sessions.
-    # Use transaction mode (port 6543) on Supabase for higher concurrency.
+    # DATABASE_URL must use session mode (port 5432), never transaction mode
+    # (port 6543): prepared statements, the COPY staging temp table and the
+    # pipeline LISTEN all live in the server session (see init_db_pool).
     init_db_pool(settings.DATABASE_URL, minconn=1, maxconn=10)
     
     # Initialize global thread pool for long-running ingestion tasks.
     # max_workers=2: With Supabase pool_size=15 and maxconn=10 for the API,
-    # each pipeline run now uses at most 1 connection at a time (scoped).
-    # 2 concurrent pipelines × 1 connection = 2. Budget is safe.
+    # each pipeline run uses at most 2 connections at a time (the ingestion
+    # loop's plus the page analysis worker's). 2 concurrent pipelines × 2 = 4,
+    # leaving 6 for requests. The 10 + 1 LISTEN connection, the cron's 3 and
+    # the dispatcher's 1 fill the 15 sessions (see the main.py docstring).
     app.state.executor = ThreadPoolExecutor(max_workers=2)
     
+    # Background sweep for runs that lost their heartbeat (crash/redeploy)
+    app.state.reaper_stop = threading.Event()
+    threading.Thread(
+        target=stale_run_reaper, args=(app.state.reaper_stop,), daemon=True
+    ).start()
+    
     yield
     
     # --- GRACEFUL SHUTDOWN ---
@@ -66,8 +98,9 @@ async def lifespan(app: FastAPI):
         finally:
             db.disconnect()
             
-    # 2. Shutdown thread pool
+    # 2. Shutdown thread pool and the stale run reaper
     app.state.executor.shutdown(wait=False) # Don't wait forever, we already marked state
+    app.state.reaper_stop.set()
     close_db_pool()
 
 
@@ -134,28 +167,23 @@ class SubscriptionRequest(BaseModel):
 # Helpers
 # -------------------------------------------------------------------------
 
-def validate_account_id(account_id: str, db: DatabasePersistence) -> None:
+def validate_account_access(account_id: str, user_id: str, db: DatabasePersistence) -> None:
     """
-    Validate that an account_id is a valid UUID and exists in the DB.
-    Raises HTTPException 400 if malformed, 404 if missing.
+    Validate that an account_id is a valid UUID, exists in the DB, and is
+    owned by the authenticated user. Existence and ownership are resolved
+    in a single query.
+    Raises HTTPException 400 if malformed, 404 if missing, 403 if not owned.
+    This does NOT change pipeline logic — pipelines always run by account_id.
     """
     try:
         UUID(account_id)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid account_id format")
 
-    if not db.account_exists(account_id):
+    owned = db.fetch_account_access(account_id, user_id)
+    if owned is None:
         raise HTTPException(status_code=404, detail="Account not found")
-
-
-def validate_account_ownership(account_id: str, user_id: str, db: DatabasePersistence) -> None:
-    """
-    Verify that the authenticated user owns the requested account.
-    Raises 403 Forbidden if ownership check fails.
-    Called after validate_account_id so we know the account exists.
-    This does NOT change pipeline logic — pipelines always run by account_id.
-    """
-    if not db.verify_account_ownership(account_id, user_id):
+    if not owned:
         raise HTTPException(status_code=403, detail="Access denied: account does not belong to your user")
 
 
@@ -239,22 +267,24 @@ def force_reauth():
 # Pipeline Control (Namespaced)
 # -------------------------------------------------------------------------
 
-def run_pipeline_wrapper(account_id: str, run_id: str):
+def run_pipeline_wrapper(account_id: str, run_id: str, force_refresh: bool = False):
     """Wrapper to track active runs on this instance for graceful shutdown."""
     instance_active_runs.add((account_id, run_id))
     try:
-        run_pipeline(account_id, run_id)
+        run_pipeline(account_id, run_id, force_refresh=force_refresh)
     finally:
         instance_active_runs.discard((account_id, run_id))
 
 @api_router.post("/pipeline/run")
-def run_pipeline_endpoint(account_id: str, user_id: str = Depends(get_current_user_id), db: DatabasePersistence = Depends(get_db)):
-    """Execute the full GSC analytics pipeline for a specific account."""
+def run_pipeline_endpoint(account_id: str, force: bool = False, user_id: str = Depends(get_current_user_id), db: DatabasePersistence = Depends(get_db)):
+    """
+    Execute the full GSC analytics pipeline for a specific account.
+    force=true re-fetches properties already ingested for the daily window.
+    """
     try:
-        validate_account_id(account_id, db)
-        validate_account_ownership(account_id, user_id, db)
+        validate_account_access(account_id, user_id, db)
         run_id = db.start_pipeline_run(account_id)
-        app.state.executor.submit(run_pipeline_wrapper, account_id, run_id)
+        app.state.executor.submit(run_pipeline_wrapper, account_id, run_id, force)
         return {"status": "started", "account_id": account_id, "run_id": run_id}
     except RuntimeError as e:
         if "already running" in str(e).lower():
@@ -269,14 +299,78 @@ def run_pipeline_endpoint(account_id: str, user_id: str = Depends(get_current_us
 @api_router.get("/pipeline/status")
 def get_pipeline_status(account_id: str, user_id: str = Depends(get_current_user_id), db: DatabasePersistence = Depends(get_db)):
     """Get current pipeline execution status for an account."""
-    validate_account_id(account_id, db)
-    validate_account_ownership(account_id, user_id, db)
+    validate_account_access(account_id, user_id, db)
     state = db.fetch_pipeline_state(account_id)
     if not state:
         return {"is_running": False, "account_id": account_id}
     return serialize_row(state)
 
 
+# An idle stream (no run in progress) is closed after this long
+PIPELINE_EVENTS_IDLE_SECONDS = 60
+# Keepalive comment interval on an otherwise quiet stream
+PIPELINE_EVENTS_HEARTBEAT_SECONDS = 15
+
+
+def read_pipeline_state(account_id: str) -> Dict[str, Any]:
+    """Current pipeline state on a short-lived pooled connection."""
+    db = DatabasePersistence()
+    db.connect()
+    try:
+        return db.fetch_pipeline_state(account_id)
+    finally:
+        db.disconnect()
+
+
+@api_router.get("/pipeline/events")
+def stream_pipeline_events(account_id: str, user_id: str = Depends(get_current_user_id), db: DatabasePersistence = Depends(get_db)):
+    """
+    Server-sent events stream of pipeline state for an account.
+    Pushed from LISTEN/NOTIFY, so the client no longer polls /pipeline/status.
+    The stream ends once a run finishes (is_running=false).
+    """
+    validate_account_access(account_id, user_id, db)
+
+    async def event_stream():
+        # Fed from the shared listener thread; awaiting it holds no worker
+        # thread and no connection while the stream is idle
+        loop = asyncio.get_running_loop()
+        states: asyncio.Queue = asyncio.Queue()
+        unsubscribe = subscribe_pipeline(
+            account_id, lambda state: loop.call_soon_threadsafe(states.put_nowait, state)
+        )
+        opened_at = time.monotonic()
+        running = False
+
+        try:
+            while True:
+                try:
+                    state = await asyncio.wait_for(states.get(), PIPELINE_EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if not running and time.monotonic() - opened_at > PIPELINE_EVENTS_IDLE_SECONDS:
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+
+                if state is None:
+                    # LISTEN is active (or re-established): read the current state
+                    # only now so no transition can slip between read and subscribe
+                    state = await run_in_threadpool(read_pipeline_state, account_id)
+
+                yield f"data: {json.dumps(state)}\n\n"
+                if running and not state["is_running"]:
+                    return
+                running = state["is_running"]
+        finally:
+            unsubscribe()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # -------------------------------------------------------------------------
 # Data Exploration (Account Scoped, Namespaced)
 # -------------------------------------------------------------------------
@@ -284,24 +378,21 @@ def get_pipeline_status(account_id: str, user_id: str = Depends(get_current_user
 @api_router.get("/websites")
 def get_websites(account_id: str, user_id: str = Depends(get_current_user_id), db: DatabasePersistence = Depends(get_db)):
     """Get all websites for an account."""
-    validate_account_id(account_id, db)
-    validate_account_ownership(account_id, user_id, db)
+    validate_account_access(account_id, user_id, db)
     websites = db.fetch_all_websites(account_id)
     return [serialize_row(w) for w in websites]
 
 @api_router.get("/websites/{website_id}/properties")
 def get_properties_by_website(website_id: str, account_id: str, user_id: str = Depends(get_current_user_id), db: DatabasePersistence = Depends(get_db)):
     """Get all properties for a website within an account."""
-    validate_account_id(account_id, db)
-    validate_account_ownership(account_id, user_id, db)
+    validate_account_access(account_id, user_id, db)
     properties = db.fetch_properties_by_website(account_id, website_id)
     return [serialize_row(p) for p in properties]
 
 @api_router.get("/properties/{property_id}/overview")
 def get_property_overview(property_id: str, account_id: str, user_id: str = Depends(get_current_user_id), db: DatabasePersistence = Depends(get_db)):
     """Get property overview with 7v7 comparison including CTR and Position."""
-    validate_account_id(account_id, db)
-    validate_account_ownership(account_id, user_id, db)
+    validate_account_access(account_id, user_id, db)
     # Fetch property metadata to get site_url (property_name)
     prop = db.fetch_property_by_id(account_id, property_id)
     if not prop:
@@ -413,8 +504,7 @@ def classify_property_health(
 @api_router.get("/dashboard-summary")
 def get_dashboard_summary(account_id: str, user_id: str = Depends(get_current_user_id), db: DatabasePersistence = Depends(get_db)):
     """Get dashboard summary with website-grouped property health status."""
-    validate_account_id(account_id, db)
-    validate_account_ownership(account_id, user_id, db)
+    validate_account_access(account_id, user_id, db)
     # Check if account data has been initialized
     if not db.is_account_data_initialized(account_id):
         return {
@@ -423,16 +513,12 @@ def get_dashboard_summary(account_id: str, user_id: str = Depends(get_current_us
             "websites": []
         }
 
-    # Fetch all websites for this account
+    # Fetch all websites and their properties (2 queries, independent of website count)
     websites = db.fetch_all_websites(account_id)
+    properties_by_website = db.fetch_properties_grouped_by_website(account_id)
 
-    # Batch fetch metrics for ALL properties at once
-    all_metrics = db.fetch_all_property_metrics_for_account(account_id)
-
-    # Group metrics by property_id in Python
-    metrics_by_prop = defaultdict(list)
-    for row in all_metrics:
-        metrics_by_prop[row['property_id']].append(row)
+    # 7v7 totals for ALL properties in one aggregate query
+    totals_by_prop = db.fetch_property_window_totals(account_id)
 
     result = {"websites": []}
 
@@ -443,19 +529,17 @@ def get_dashboard_summary(account_id: str, user_id: str = Depends(get_current_us
             "properties": []
         }
 
-        properties = db.fetch_properties_by_website(account_id, website['id'])
+        properties = properties_by_website.get(website['id'], [])
 
         for prop in properties:
             property_id = prop['id']
-            prop_metrics = metrics_by_prop.get(property_id)
+            totals = totals_by_prop.get(property_id)
 
-            if not prop_metrics:
+            if not totals:
                 continue
 
-            most_recent_date = get_most_recent_date(prop_metrics)
-            last_rows, prev_rows = split_rows_by_window(prop_metrics, most_recent_date)
-            last_7 = aggregate_metrics(last_rows)
-            prev_7 = aggregate_metrics(prev_rows)
+            last_7 = {"impressions": totals["last_7_impressions"], "clicks": totals["last_7_clicks"]}
+            prev_7 = {"impressions": totals["prev_7_impressions"], "clicks": totals["prev_7_clicks"]}
 
             status = classify_property_health(
                 last_7["impressions"],
@@ -468,9 +552,9 @@ def get_dashboard_summary(account_id: str, user_id: str = Depends(get_current_us
                 "property_id": property_id,
                 "property_name": prop['site_url'],
                 "status": status,
-                "data_through": most_recent_date.isoformat(),
-                "last_7": {"impressions": last_7["impressions"], "clicks": last_7["clicks"]},
-                "prev_7": {"impressions": prev_7["impressions"], "clicks": prev_7["clicks"]},
+                "data_through": totals["data_through"].isoformat(),
+                "last_7": last_7,
+                "prev_7": prev_7,
                 "delta_pct": {
                     "impressions": safe_delta_pct(last_7["impressions"], prev_7["impressions"]),
                     "clicks": safe_delta_pct(last_7["clicks"], prev_7["clicks"])
@@ -485,8 +569,7 @@ def get_dashboard_summary(account_id: str, user_id: str = Depends(get_current_us
 @api_router.get("/properties/{property_id}/pages")
 def get_page_visibility(property_id: str, account_id: str, user_id: str = Depends(get_current_user_id), db: DatabasePersistence = Depends(get_db)):
     """Get page visibility analysis for a property."""
-    validate_account_id(account_id, db)
-    validate_account_ownership(account_id, user_id, db)
+    validate_account_access(account_id, user_id, db)
     property_data = db.fetch_property_by_id(account_id, property_id)
     if not property_data:
         raise HTTPException(status_code=404, detail="Property not found")
@@ -513,8 +596,7 @@ def get_page_visibility(property_id: str, account_id: str, user_id: str = Depend
 @api_router.get("/properties/{property_id}/devices")
 def get_device_visibility(property_id: str, account_id: str, user_id: str = Depends(get_current_user_id), db: DatabasePersistence = Depends(get_db)):
     """Get device visibility analysis for a property."""
-    validate_account_id(account_id, db)
-    validate_account_ownership(account_id, user_id, db)
+    validate_account_access(account_id, user_id, db)
     property_data = db.fetch_property_by_id(account_id, property_id)
     if not property_data:
         raise HTTPException(status_code=404, detail="Property not found")
@@ -543,8 +625,7 @@ def get_property_all_data(
     Returns overview + pages + devices in a single DB connection.
     Replaces 3 parallel GET requests with exactly 1.
     """
-    validate_account_id(account_id, db)
-    validate_account_ownership(account_id, user_id, db)
+    validate_account_access(account_id, user_id, db)
 
     property_data = db.fetch_property_by_id(account_id, property_id)
     if not property_data:
@@ -616,8 +697,7 @@ def get_property_all_data(
 @api_router.get("/alerts")
 def get_alerts(account_id: str, limit: int = 20, user_id: str = Depends(get_current_user_id), db: DatabasePersistence = Depends(get_db)):
     """Get recent alerts for an account."""
-    validate_account_id(account_id, db)
-    validate_account_ownership(account_id, user_id, db)
+    validate_account_access(account_id, user_id, db)
     alerts = db.fetch_recent_alerts(account_id, limit)
     return [serialize_row(a) for a in alerts]
 
@@ -626,24 +706,21 @@ def get_alerts(account_id: str, limit: int = 20, user_id: str = Depends(get_curr
 @api_router.get("/alert-recipients")
 def get_alert_recipients(account_id: str, user_id: str = Depends(get_current_user_id), db: DatabasePersistence = Depends(get_db)):
     """Get all alert recipients for an account."""
-    validate_account_id(account_id, db)
-    validate_account_ownership(account_id, user_id, db)
+    validate_account_access(account_id, user_id, db)
     recipients = db.fetch_alert_recipients(account_id)
     return {"account_id": account_id, "recipients": recipients}
 
 @api_router.post("/alert-recipients")
 def add_alert_recipient(request: RecipientRequest, user_id: str = Depends(get_current_user_id), db: DatabasePersistence = Depends(get_db)):
     """Add a new alert recipient."""
-    validate_account_id(request.account_id, db)
-    validate_account_ownership(request.account_id, user_id, db)
+    validate_account_access(request.account_id, user_id, db)
     db.add_alert_recipient(request.account_id, request.email)
     return {"status": "success"}
 
 @api_router.delete("/alert-recipients")
 def remove_alert_recipient(account_id: str, email: str, user_id: str = Depends(get_current_user_id), db: DatabasePersistence = Depends(get_db)):
     """Remove an alert recipient."""
-    validate_account_id(account_id, db)
-    validate_account_ownership(account_id, user_id, db)
+    validate_account_access(account_id, user_id, db)
     db.remove_alert_recipient(account_id, email)
     return {"status": "success"}
 
@@ -653,24 +730,21 @@ def remove_alert_recipient(account_id: str, email: str, user_id: str = Depends(g
 @api_router.get("/alert-subscriptions")
 def get_alert_subscriptions(account_id: str, email: str, user_id: str = Depends(get_current_user_id), db: DatabasePersistence = Depends(get_db)):
     """Get all property_ids this email is subscribed to for an account."""
-    validate_account_id(account_id, db)
-    validate_account_ownership(account_id, user_id, db)
+    validate_account_access(account_id, user_id, db)
     property_ids = db.fetch_alert_subscriptions(account_id, email)
     return {"account_id": account_id, "email": email, "property_ids": property_ids}
 
 @api_router.post("/alert-subscriptions")
 def add_alert_subscription(request: SubscriptionRequest, user_id: str = Depends(get_current_user_id), db: DatabasePersistence = Depends(get_db)):
     """Subscribe an email to alerts for a specific property."""
-    validate_account_id(request.account_id, db)
-    validate_account_ownership(request.account_id, user_id, db)
+    validate_account_access(request.account_id, user_id, db)
     db.add_alert_subscription(request.account_id, request.email, request.property_id)
     return {"status": "success"}
 
 @api_router.delete("/alert-subscriptions")
 def remove_alert_subscription(account_id: str, email: str, property_id: str, user_id: str = Depends(get_current_user_id), db: DatabasePersistence = Depends(get_db)):
     """Unsubscribe an email from alerts for a specific property."""
-    validate_account_id(account_id, db)
-    validate_account_ownership(account_id, user_id, db)
+    validate_account_access(account_id, user_id, db)
     db.remove_alert_subscription(account_id, email, property_id)
     return {"status": "success"}
 
@@ -717,8 +791,7 @@ def get_alert_config_data(
     Replaces 1 + N + 1 + M HTTP requests with exactly 1.
     DB cost: 4 sequential SQL queries, 1 connection, released immediately.
     """
-    validate_account_id(account_id, db)
-    validate_account_ownership(account_id, user_id, db)
+    validate_account_access(account_id, user_id, db)
 
     # fetch_all_properties returns: {id, site_url, property_type, permission_level, base_domain}
     # It JOINs websites internally, so base_domain is available directly on each property row.
@@ -25,12 +25,9 @@ from jose import jwt, JWTError
 from src.settings import settings
 
 
-def _supabase_issuer() -> str:
-    return f"{settings.SUPABASE_URL.rstrip('/')}/auth/v1"
-
-
-def _jwks_url() -> str:
-    return f"{_supabase_issuer()}/.well-known/jwks.json"
+# Derived once at import: settings are loaded once per process and never change
+_SUPABASE_ISSUER: str = f"{settings.SUPABASE_URL.rstrip('/')}/auth/v1"
+_JWKS_URL: str = f"{_SUPABASE_ISSUER}/.well-known/jwks.json"
 
 
 # ─── JWKS cache (in-memory, 6-hour TTL) ───────────────────────────────────────
@@ -50,7 +47,7 @@ def _get_jwks() -> dict:
             return _jwks_cache
 
         try:
-            resp = requests.get(_jwks_url(), timeout=5)
+            resp = requests.get(_JWKS_URL, timeout=5)
             resp.raise_for_status()
             _jwks_cache = resp.json()
             _jwks_cache_ts = now
@@ -104,7 +101,7 @@ def verify_supabase_jwt(token: str) -> dict:
             public_key_data,
             algorithms=["ES256"],
             audience="authenticated",
-            issuer=_supabase_issuer(),
+            issuer=_SUPABASE_ISSUER,
         )
         return payload
     except JWTError as e:
@@ -2,6 +2,10 @@ from __future__ import annotations
 """
 GSC Radar - Daily Pipeline Cron Service
 Orchestrates sequential ingestion for all accounts in the database.
+
+Usage: python -m src.daily_pipeline_cron [--force]
+    --force  Re-fetch the daily window even for properties already logged
+             as ingested (e.g. after a GSC data correction)
 """
 
 import sys
@@ -29,10 +33,15 @@ def log_cron(message: str, level: str = "INFO"):
     print(f"[{timestamp}] [CRON-PIPELINE] {prefix} {message}")
 
 def main():
+    force_refresh = "--force" in sys.argv[1:]
+    
     log_cron("Starting Daily Pipeline Cron Orchestrator...")
+    if force_refresh:
+        log_cron("--force: already-ingested properties will be re-fetched", "WARNING")
     
     # Initialize DB Pool
-    init_db_pool(settings.DATABASE_URL)
+    # maxconn=3: this orchestrator's own connection + one pipeline's 2
+    init_db_pool(settings.DATABASE_URL, minconn=1, maxconn=3)
     
     db = DatabasePersistence()
     db.connect()
@@ -59,7 +68,7 @@ def main():
                 
                 # 2. Execute the full pipeline
                 # run_pipeline internally handles its own DB connection but uses the global pool
-                run_pipeline(account_id, run_id)
+                run_pipeline(account_id, run_id, force_refresh=force_refresh)
                 
                 log_cron(f"Successfully completed pipeline for {email}.", "SUCCESS")
                 success_count += 1
@@ -1,33 +1,208 @@
 from __future__ import annotations
+import csv
+import io
 import os
 import psycopg2
+import psycopg2.extensions
+import select
+import socket
 import threading
-from psycopg2.extras import RealDictCursor, execute_batch
+import time
+from itertools import groupby
+from operator import itemgetter
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor, execute_values
 from psycopg2.pool import ThreadedConnectionPool
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional, Iterable, Set, Tuple
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import date, datetime, timedelta
 import json
 from src.auth.token_model import GSCAuthToken
-from src.config.date_windows import GSC_LAG_DAYS, ANALYSIS_WINDOW_DAYS, INGESTION_WINDOW_DAYS
+from src.config.date_windows import GSC_LAG_DAYS, ANALYSIS_WINDOW_DAYS, INGESTION_WINDOW_DAYS, HALF_ANALYSIS_WINDOW
 
 # Load environment variables
 load_dotenv()
 
+# Device metric batches larger than this are loaded with COPY into a staging
+# table instead of multi-row INSERT
+DEVICE_METRICS_COPY_THRESHOLD = 500
+
+# metric_type values in ingestion_log; a property's day counts as ingested
+# only once all of them are logged
+INGESTION_METRIC_TYPES = ('property', 'page', 'device')
+
+# Accounts known to have data_initialized = TRUE (process-wide; the flag is
+# only ever set, never cleared, so positive results are safe to keep)
+_INITIALIZED_ACCOUNTS = set()
+
+# (account_id, property_id) pairs already verified as owned. Properties are
+# never moved between accounts, so a confirmed pair stays valid.
+_OWNED_PROPERTIES = set()
+
+# Short-lived in-process caches for rarely changing lookups
+# (account_id -> alert recipients, property_id -> device analysis window;
+#  device rows only change on ingestion)
+_LOOKUP_CACHE_TTL_SECONDS = 300
+_LOOKUP_CACHE_MAXSIZE = 10_000
+_recipients_cache: Dict[str, Tuple[float, List[str]]] = {}
+_device_window_cache: Dict[str, Tuple[float, Tuple[Dict[str, Any], ...]]] = {}
+_lookup_cache_lock = threading.Lock()
+
+
+def _cache_get(cache: Dict[str, Tuple[float, Any]], key: str) -> Optional[Any]:
+    """Return a cached value if present and younger than the TTL."""
+    with _lookup_cache_lock:
+        entry = cache.get(key)
+        if entry is not None and (time.monotonic() - entry[0]) < _LOOKUP_CACHE_TTL_SECONDS:
+            return entry[1]
+        return None
+
+
+def _cache_put(cache: Dict[str, Tuple[float, Any]], key: str, value: Any) -> None:
+    """Store a value; the whole cache is dropped when it reaches its size cap."""
+    with _lookup_cache_lock:
+        if len(cache) >= _LOOKUP_CACHE_MAXSIZE:
+            cache.clear()
+        cache[key] = (time.monotonic(), value)
+
+
+def _cache_invalidate(cache: Dict[str, Tuple[float, Any]], key: str) -> None:
+    with _lookup_cache_lock:
+        cache.pop(key, None)
+
+# Server-side prepared statements for small queries issued in tight loops.
+# They are session state, so they need a session-mode pool (see init_db_pool).
+# name -> (parameter types, statement body using $n placeholders)
+_PREPARED_SQL = {
+    'fetch_recent_alert': ('uuid, uuid, text, integer', """
+        SELECT id, triggered_at 
+        FROM alerts 
+        WHERE account_id = $1 
+          AND property_id = $2 
+          AND alert_type = $3 
+          AND triggered_at >= NOW() - ($4 * INTERVAL '1 hour')
+        ORDER BY triggered_at DESC
+        LIMIT 1
+    """),
+    'is_run_active': ('uuid, uuid', """
+        SELECT is_running FROM pipeline_runs
+        WHERE id = $1 AND account_id = $2
+    """),
+    'fetch_device_metrics_for_analysis': ('uuid, integer', """
+        WITH bounds AS (
+            SELECT MAX(date) AS max_date
+            FROM device_daily_metrics
+            WHERE property_id = $1
+        )
+        SELECT 
+            m.device,
+            m.date,
+            m.clicks,
+            m.impressions,
+            m.ctr,
+            m.position
+        FROM device_daily_metrics m, bounds b
+        WHERE m.property_id = $1
+          AND m.date >= b.max_date - ($2 * INTERVAL '1 day')
+        ORDER BY m.device, m.date DESC
+    """),
+}
+
+# Stale pipeline run termination (see cleanup_stale_runs for the policy).
+# Kept as a bare UPDATE so callers can append an account filter and/or embed
+# it as a writable CTE.
+_CLEANUP_STALE_RUNS_SQL = """
+    UPDATE pipeline_runs
+    SET is_running = false,
+        error = CASE 
+            WHEN started_at < NOW() - INTERVAL '2 hours' THEN 'Hard timeout exceeded (2h)'
+            ELSE 'Stale run auto-terminated (no heartbeat)'
+        END,
+        completed_at = NOW(),
+        updated_at = NOW()
+    WHERE is_running = true 
+      AND (
+          updated_at < NOW() - INTERVAL '20 minutes' 
+          OR started_at < NOW() - INTERVAL '2 hours'
+      )
+"""
+
+# Pipeline state change payload for pg_notify, built from a RETURNING row.
+# Keys match fetch_pipeline_state; error is clipped to stay under the 8000
+# byte NOTIFY payload limit.
+_PIPELINE_NOTIFY_PAYLOAD = """
+    json_build_object(
+        'is_running', is_running,
+        'current_step', current_step,
+        'progress_current', COALESCE(progress_current, 0),
+        'progress_total', COALESCE(progress_total, 0),
+        'error', left(error, 1000),
+        'started_at', started_at,
+        'completed_at', completed_at
+    )::text
+"""
+
+_PIPELINE_RETURNING = """
+    RETURNING
+        account_id, is_running, current_step,
+        progress_current, progress_total,
+        error, started_at, completed_at
+"""
+
+
+def pipeline_channel(account_id: str) -> str:
+    """LISTEN/NOTIFY channel carrying pipeline state changes for an account."""
+    return f"pipeline_{str(account_id).lower()}"
+
+def _rows_to_dicts(cursor, rows: List[tuple]) -> List[Dict[str, Any]]:
+    """Build plain dicts from tuple rows using the cursor's column names."""
+    columns = [col.name for col in cursor.description]
+    return [dict(zip(columns, row)) for row in rows]
+
 # -------------------------------------------------------------------------
 # Global Connection Pool Manager
 # -------------------------------------------------------------------------
 
+# NUMERIC columns (ctr, position, delta_pct) decoded straight to float
+# instead of Decimal, so analysis code sums native floats
+_NUMERIC_AS_FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values,
+    'NUMERIC_AS_FLOAT',
+    lambda value, cur: float(value) if value is not None else None
+)
+
+
+class _PooledConnection(psycopg2.extensions.connection):
+    """Pool connection that remembers which statements it has PREPAREd."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+        psycopg2.extensions.register_type(_NUMERIC_AS_FLOAT, self)
+
+
 _db_pool: Optional[ThreadedConnectionPool] = None
+_db_url: Optional[str] = None
 _pool_lock = threading.Lock()
 
 def init_db_pool(db_url: str, minconn: int = 1, maxconn: int = 10):
-    """Initialize the global database connection pool once."""
-    global _db_pool
+    """
+    Initialize the global database connection pool once.
+    
+    db_url must reach Postgres directly or through a session-mode pooler
+    (Supabase port 5432). This module keeps state in the server session:
+    PREPAREd statements (_PREPARED_SQL), the _stage_dm temp table used by
+    COPY, and the pipeline LISTEN. A transaction-mode pooler (port 6543)
+    hands each transaction a different server session and breaks all three.
+    """
+    global _db_pool, _db_url
     with _pool_lock:
         if _db_pool is None:
+            _db_url = db_url
             print(f"[DB] Initializing connection pool (maxconn={maxconn})...")
-            _db_pool = ThreadedConnectionPool(minconn, maxconn, db_url)
+            _db_pool = ThreadedConnectionPool(
+                minconn, maxconn, db_url, connection_factory=_PooledConnection
+            )
             print("[DB] ✓ Connection pool initialized")
 
 def get_db_pool() -> ThreadedConnectionPool:
@@ -37,14 +212,160 @@ def get_db_pool() -> ThreadedConnectionPool:
     return _db_pool
 
 def close_db_pool():
-    """Close the global database connection pool."""
-    global _db_pool
+    """Close the global database connection pool (and the pipeline listener)."""
+    global _db_pool, _pipeline_listener
+    if _pipeline_listener:
+        _pipeline_listener.close()
+        _pipeline_listener = None
     if _db_pool:
         _db_pool.closeall()
         print("[DB] Connection pool closed")
         _db_pool = None
 
 
+# Seconds the pipeline listener waits before reconnecting a dropped connection,
+# and idle seconds after which it pings the server to detect a dead one
+PIPELINE_LISTENER_RETRY_SECONDS = 5.0
+PIPELINE_LISTENER_PING_SECONDS = 60.0
+
+_pipeline_listener: Optional[_PipelineListener] = None
+
+
+class _PipelineListener:
+    """
+    The process's single LISTEN connection (outside the pool), shared by
+    every pipeline event subscriber. A daemon thread LISTENs on each channel
+    while it has subscribers and hands every notification to their callbacks,
+    so subscribers cost no connection and no thread of their own.
+    """
+
+    def __init__(self, db_url: str):
+        self._db_url = db_url
+        self._lock = threading.Lock()
+        # channel -> callbacks; callbacks run on the listener thread and must not block
+        self._subscribers: Dict[str, Set[Callable[[Optional[Dict[str, Any]]], None]]] = {}
+        # Callbacks still owed a None once their channel's LISTEN is active
+        self._unconfirmed: List[Callable[[Optional[Dict[str, Any]]], None]] = []
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._stop = threading.Event()
+        threading.Thread(target=self._run, name="pipeline-listener", daemon=True).start()
+
+    def subscribe(self, account_id: str, callback: Callable[[Optional[Dict[str, Any]]], None]) -> None:
+        with self._lock:
+            self._subscribers.setdefault(pipeline_channel(account_id), set()).add(callback)
+            self._unconfirmed.append(callback)
+        self._wake()
+
+    def unsubscribe(self, account_id: str, callback: Callable[[Optional[Dict[str, Any]]], None]) -> None:
+        channel = pipeline_channel(account_id)
+        with self._lock:
+            callbacks = self._subscribers.get(channel, set())
+            callbacks.discard(callback)
+            if not callbacks:
+                self._subscribers.pop(channel, None)
+            if callback in self._unconfirmed:
+                self._unconfirmed.remove(callback)
+        self._wake()
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake()
+
+    def _wake(self) -> None:
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            pass
+
+    @staticmethod
+    def _deliver(callbacks, state: Optional[Dict[str, Any]]) -> None:
+        for callback in callbacks:
+            try:
+                callback(state)
+            except Exception as e:
+                print(f"[DB] Pipeline subscriber callback failed: {e}")
+
+    def _run(self) -> None:
+        conn = None
+        listening = set()
+        while not self._stop.is_set():
+            try:
+                if conn is None:
+                    conn = psycopg2.connect(self._db_url)
+                    conn.autocommit = True
+                    listening = set()
+
+                with self._lock:
+                    wanted = set(self._subscribers)
+                    confirmed, self._unconfirmed = self._unconfirmed, []
+                with conn.cursor() as cur:
+                    for channel in wanted - listening:
+                        cur.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+                    for channel in listening - wanted:
+                        cur.execute(sql.SQL("UNLISTEN {}").format(sql.Identifier(channel)))
+                listening = wanted
+                # None tells a subscriber its LISTEN is active
+                self._deliver(confirmed, None)
+
+                readable, _, _ = select.select([conn, self._wake_r], [], [], PIPELINE_LISTENER_PING_SECONDS)
+                if not readable:
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT 1")
+                if self._wake_r in readable:
+                    self._wake_r.recv(4096)
+                if conn in readable:
+                    conn.poll()
+                # Any statement above may also have collected notifications
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    with self._lock:
+                        callbacks = list(self._subscribers.get(notify.channel, ()))
+                    self._deliver(callbacks, json.loads(notify.payload))
+
+            except (psycopg2.Error, OSError) as e:
+                print(f"[DB] Pipeline listener connection lost, reconnecting: {e}")
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                    conn = None
+                # Notifications may have been missed: every subscriber gets a
+                # fresh None (re-read the state) once LISTEN is back
+                with self._lock:
+                    self._unconfirmed = [cb for callbacks in self._subscribers.values() for cb in callbacks]
+                self._stop.wait(PIPELINE_LISTENER_RETRY_SECONDS)
+
+        if conn is not None:
+            conn.close()
+
+
+def subscribe_pipeline(
+    account_id: str,
+    callback: Callable[[Optional[Dict[str, Any]]], None]
+) -> Callable[[], None]:
+    """
+    Subscribe to pipeline state changes for an account via the shared
+    LISTEN/NOTIFY connection. callback(None) runs once the LISTEN is active
+    (and again after a reconnect, when notifications may have been missed),
+    otherwise callback(state) with the decoded payload of each notification.
+    Callbacks run on the listener thread, so they must hand off and return.
+    
+    Returns:
+        A function that removes the subscription
+    """
+    global _pipeline_listener
+    with _pool_lock:
+        if _db_url is None:
+            raise RuntimeError("Database connection pool not initialized. Call init_db_pool() first.")
+        if _pipeline_listener is None:
+            _pipeline_listener = _PipelineListener(_db_url)
+        listener = _pipeline_listener
+    
+    listener.subscribe(account_id, callback)
+    return lambda: listener.unsubscribe(account_id, callback)
+
+
 def get_db():
     """
     FastAPI dependency: borrow a connection from the pool, yield the
@@ -71,6 +392,9 @@ class DatabasePersistence:
         self.pool = get_db_pool()
         self.connection = None
         self.cursor = None
+        # (cache, key) entries made stale by the open transaction; dropped only
+        # once it commits, so a concurrent reader cannot re-cache pre-commit rows
+        self._stale_cache_keys = []
     
     def connect(self) -> None:
         """
@@ -99,23 +423,54 @@ class DatabasePersistence:
             self.connection = None
             self.cursor = None
     
-    def begin_transaction(self) -> None:
-        """Begin a database transaction"""
+    def _execute_prepared(self, name: str, params: tuple, cursor=None) -> None:
+        """
+        EXECUTE a statement from _PREPARED_SQL, PREPAREing it first if this
+        pooled connection has not seen it yet. Prepared statements live for
+        the whole session, so the parse/plan cost is paid once per connection.
+        Runs on self.cursor unless another cursor of this connection is given.
+        """
+        cursor = cursor or self.cursor
+        prepared = self.connection.prepared_statements
+        param_types, body = _PREPARED_SQL[name]
+        if name not in prepared:
+            cursor.execute(f"PREPARE {name} ({param_types}) AS {body}")
+            prepared.add(name)
+        placeholders = ", ".join(["%s"] * (param_types.count(",") + 1))
+        cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+
+    def begin_transaction(self, synchronous_commit: bool = True) -> None:
+        """
+        Begin a database transaction.
+        
+        Args:
+            synchronous_commit: Pass False for bulk metric writes whose rows can be
+                re-fetched from GSC: COMMIT then returns without waiting for the
+                WAL flush (SET LOCAL, so it reverts when the transaction ends).
+                A server crash can lose only the last few hundred ms of commits;
+                it never corrupts or half-applies a transaction.
+        """
         if not self.connection:
             raise RuntimeError("Must connect to database before starting transaction")
+        if not synchronous_commit:
+            self.cursor.execute("SET LOCAL synchronous_commit = off")
         print("[DB] Starting transaction...")
     
     def commit_transaction(self) -> None:
-        """Commit the current transaction"""
+        """Commit the current transaction, then drop cache entries it made stale"""
         if self.connection:
             self.connection.commit()
             print("[DB] ✓ Transaction committed")
+        for cache, key in self._stale_cache_keys:
+            _cache_invalidate(cache, key)
+        self._stale_cache_keys = []
 
     def rollback_transaction(self) -> None:
         """Rollback the current transaction"""
         if self.connection:
             self.connection.rollback()
             print("[DB] ✗ Transaction rolled back")
+        self._stale_cache_keys = []
 
     # ========================================
     # ACCOUNT & TOKEN MANAGEMENT
@@ -196,6 +551,9 @@ class DatabasePersistence:
         Returns:
             True if data has been initialized, False otherwise
         """
+        # data_initialized never reverts to FALSE, so a positive answer is final
+        if account_id in _INITIALIZED_ACCOUNTS:
+            return True
         try:
             self.cursor.execute("""
                 SELECT data_initialized
@@ -203,28 +561,14 @@ class DatabasePersistence:
                 WHERE id = %s
             """, (account_id,))
             result = self.cursor.fetchone()
-            return result['data_initialized'] if result else False
+            initialized = result['data_initialized'] if result else False
+            if initialized:
+                _INITIALIZED_ACCOUNTS.add(account_id)
+            return initialized
         except Exception as e:
             print(f"[DB ERROR] Failed to check initialization status: {e}")
             return False
 
-    def account_exists(self, account_id: str) -> bool:
-        """
-        Check if an account exists in the database.
-        
-        Args:
-            account_id: UUID of the account
-            
-        Returns:
-            True if account exists, False otherwise
-        """
-        try:
-            self.cursor.execute("SELECT 1 FROM accounts WHERE id = %s", (account_id,))
-            return self.cursor.fetchone() is not None
-        except Exception as e:
-            print(f"[DB ERROR] Failed to check account existence: {e}")
-            return False
-
     def fetch_all_accounts(self) -> List[Dict[str, Any]]:
         """
         Fetch ALL accounts — used exclusively by the cron dispatcher.
@@ -263,26 +607,28 @@ class DatabasePersistence:
             print(f"[ERROR] Failed to fetch accounts for user {user_id}: {e}")
             raise RuntimeError(f"Database error fetching accounts for user: {e}") from e
 
-    def verify_account_ownership(self, account_id: str, user_id: str) -> bool:
+    def fetch_account_access(self, account_id: str, user_id: str) -> Optional[bool]:
         """
-        Check that an account belongs to the given Supabase user.
-        Use this before any write or read operation on behalf of a user.
+        Resolve account existence and ownership in one round-trip.
 
         Args:
             account_id: UUID of the GSC account
             user_id: Supabase Auth UUID
 
         Returns:
-            True if the account is owned by the user, False otherwise
+            None if the account does not exist, otherwise whether it is
+            owned by the user
         """
         try:
             self.cursor.execute("""
-                SELECT 1 FROM accounts
-                WHERE id = %s AND user_id = %s
-            """, (account_id, user_id))
-            return self.cursor.fetchone() is not None
+                SELECT COALESCE(user_id = %s, false) AS owned
+                FROM accounts
+                WHERE id = %s
+            """, (user_id, account_id))
+            row = self.cursor.fetchone()
+            return bool(row['owned']) if row else None
         except psycopg2.Error as e:
-            print(f"[ERROR] Failed to verify account ownership: {e}")
+            print(f"[ERROR] Failed to resolve account access: {e}")
             return False
 
     def upsert_gsc_token(self, account_id: str, token: GSCAuthToken) -> None:
@@ -373,168 +719,75 @@ class DatabasePersistence:
             print(f"[ERROR] Failed to fetch token for {account_id}: {e}")
             raise RuntimeError(f"Database error fetching token: {e}") from e
     
-    def check_needs_backfill(self, account_id: str, property_id: str) -> bool:
+    def check_needs_backfill_bulk(self, account_id: str, property_ids: List[str]) -> Dict[str, bool]:
         """
-        Check if a property has at least 14 days of data in all 3 metric tables.
-        Validates precisely against the canonical ANALYSIS_WINDOW_DAYS.
+        Check whether properties have at least ANALYSIS_WINDOW_DAYS of data in
+        all 3 metric tables, in one query: distinct dates in the canonical
+        check window are counted per property and table.
         
         Args:
             account_id: UUID of the account
-            property_id: UUID of the property
+            property_ids: UUIDs of the properties
             
         Returns:
-            True if backfill is needed, False otherwise
+            Dict property_id -> True if backfill is needed (properties not
+            found for the account need one)
         """
         if not self.connection or not self.cursor:
             raise RuntimeError("Database connection not established")
-
-        try:
-            tables_to_check = [
-                'property_daily_metrics',
-                'page_daily_metrics',
-                'device_daily_metrics'
-            ]
-            
-            # Canonical check window (16 days = 14 analysis + 2 lag)
-            check_interval = INGESTION_WINDOW_DAYS
-            
-            for table in tables_to_check:
-                query = f"""
-                    SELECT COUNT(DISTINCT m.date) as date_count
-                    FROM {table} m
-                    JOIN properties p ON m.property_id = p.id
-                    WHERE m.property_id = %s
-                      AND p.account_id = %s
-                      AND m.date BETWEEN CURRENT_DATE - INTERVAL '%s days' 
-                                   AND CURRENT_DATE - INTERVAL '%s days'
-                """
-                
-                self.cursor.execute(query, (property_id, account_id, check_interval, GSC_LAG_DAYS))
-                result = self.cursor.fetchone()
-                count = result['date_count'] if result else 0
-                
-                if count < ANALYSIS_WINDOW_DAYS:
-                    print(f"[BACKFILL CHECK] {table} incomplete: found {count}/{ANALYSIS_WINDOW_DAYS} days for property {property_id}")
-                    return True
-            
-            print(f"[BACKFILL CHECK] Property {property_id} has sufficient data ({ANALYSIS_WINDOW_DAYS} days) in all tables.")
-            return False
-            
-        except psycopg2.Error as e:
-            print(f"[ERROR] check_needs_backfill failed for {property_id}: {e}")
-            raise RuntimeError(f"Database error checking backfill needs: {e}") from e
-        except Exception as e:
-            print(f"[ERROR] Failed to check backfill status for {property_id}: {e}")
-            return False
-
-    def insert_website(self, account_id: str, base_domain: str) -> Optional[str]:
-        """
-        Insert a website into the database
-        Uses ON CONFLICT DO NOTHING for idempotency
-        
-        Args:
-            account_id: UUID of the account
-            base_domain: The base domain (e.g., 'example.com')
-        
-        Returns:
-            UUID of the website (existing or newly inserted)
-        """
-        try:
-            # Attempt insert with ON CONFLICT DO NOTHING (account_id scoped)
-            self.cursor.execute("""
-                INSERT INTO websites (account_id, base_domain, display_name, created_at)
-                VALUES (%s, %s, %s, NOW())
-                ON CONFLICT (account_id, base_domain) DO NOTHING
-                RETURNING id
-            """, (account_id, base_domain, base_domain))
-            
-            result = self.cursor.fetchone()
-            
-            if result:
-                # New insert
-                website_id = result['id']
-                print(f"[INSERT] Website: {base_domain} (id: {website_id})")
-                return website_id
-            else:
-                # Already exists, fetch existing ID for THIS account
-                self.cursor.execute("""
-                    SELECT id FROM websites 
-                    WHERE account_id = %s AND base_domain = %s
-                """, (account_id, base_domain))
-                result = self.cursor.fetchone()
-                
-                if result:
-                    website_id = result['id']
-                    # print(f"[SKIP]   Website already exists: {base_domain} (id: {website_id})")
-                    return website_id
-                else:
-                    raise RuntimeError(f"Failed to retrieve website ID for {base_domain}")
         
-        except psycopg2.Error as e:
-            print(f"[ERROR] Failed to insert website '{base_domain}': {e}")
-            raise RuntimeError(f"Database error inserting website: {e}") from e
-    
-    def insert_property(
-        self, 
-        account_id: str,
-        website_id: str, 
-        site_url: str, 
-        property_type: str, 
-        permission_level: str
-    ) -> Optional[str]:
-        """
-        Insert a property into the database
-        Uses ON CONFLICT DO NOTHING for idempotency
+        if not property_ids:
+            return {}
         
-        Args:
-            account_id: UUID of the account
-            website_id: UUID of the parent website
-            site_url: Full GSC property URL
-            property_type: "sc_domain" or "url_prefix"
-            permission_level: GSC permission level
+        tables = ('property_daily_metrics', 'page_daily_metrics', 'device_daily_metrics')
+        day_counts = ",\n".join(
+            f"""(SELECT COUNT(DISTINCT m.date) FROM {table} m
+                 WHERE m.property_id = p.id
+                   AND m.date BETWEEN CURRENT_DATE - %(check_interval)s
+                                  AND CURRENT_DATE - %(lag)s) AS {table}"""
+            for table in tables
+        )
         
-        Returns:
-            UUID of the property (existing or newly inserted)
-        """
         try:
-            # Attempt insert with ON CONFLICT DO NOTHING (account_id scoped)
-            self.cursor.execute("""
-                INSERT INTO properties (account_id, website_id, site_url, property_type, permission_level, created_at)
-                VALUES (%s, %s, %s, %s, %s, NOW())
-                ON CONFLICT (account_id, site_url) DO NOTHING
-                RETURNING id
-            """, (account_id, website_id, site_url, property_type, permission_level))
+            with self.connection.cursor() as cur:
+                cur.execute(f"""
+                    SELECT p.id, {day_counts}
+                    FROM properties p
+                    WHERE p.account_id = %(account_id)s
+                      AND p.id = ANY(%(property_ids)s::uuid[])
+                """, {
+                    'account_id': account_id,
+                    'property_ids': list(property_ids),
+                    'check_interval': INGESTION_WINDOW_DAYS,
+                    'lag': GSC_LAG_DAYS
+                })
+                rows = cur.fetchall()
             
-            result = self.cursor.fetchone()
+            needs_backfill = dict.fromkeys(property_ids, True)
+            for property_id, *counts in rows:
+                incomplete = [
+                    f"{table} {count}/{ANALYSIS_WINDOW_DAYS}"
+                    for table, count in zip(tables, counts)
+                    if count < ANALYSIS_WINDOW_DAYS
+                ]
+                if incomplete:
+                    print(f"[BACKFILL CHECK] Property {property_id} incomplete: {', '.join(incomplete)} days")
+                needs_backfill[property_id] = bool(incomplete)
             
-            if result:
-                # New insert
-                property_id = result['id']
-                print(f"[INSERT] Property: {site_url} (id: {property_id})")
-                return property_id
-            else:
-                # Already exists
-                self.cursor.execute("""
-                    SELECT id FROM properties 
-                    WHERE account_id = %s AND site_url = %s
-                """, (account_id, site_url))
-                result = self.cursor.fetchone()
-                
-                if result:
-                    property_id = result['id']
-                    # print(f"[SKIP]   Property already exists: {site_url}")
-                    return property_id
-                else:
-                    raise RuntimeError(f"Failed to retrieve property ID for {site_url}")
+            return needs_backfill
         
         except psycopg2.Error as e:
-            print(f"[ERROR] Failed to insert property '{site_url}': {e}")
-            raise RuntimeError(f"Database error inserting property: {e}") from e
-    
+            print(f"[ERROR] check_needs_backfill_bulk failed for {len(property_ids)} properties: {e}")
+            raise RuntimeError(f"Database error checking backfill needs: {e}") from e
+
     def persist_grouped_properties(self, account_id: str, grouped_properties: Dict[str, List[Dict[str, Any]]]) -> Dict[str, int]:
         """
         Persist all grouped properties to database
         
+        Websites and properties are each written with a single multi-row
+        INSERT (execute_values), so the round-trip count is constant
+        instead of growing with the number of domains and properties.
+        
         Args:
             account_id: UUID of the account
             grouped_properties: Dictionary mapping base_domain -> list of properties
@@ -550,50 +803,75 @@ class DatabasePersistence:
             print("="*80 + "\n")
             
             # Sort by base domain for consistent output
-            for base_domain in sorted(grouped_properties.keys()):
-                properties = grouped_properties[base_domain]
+            base_domains = sorted(grouped_properties.keys())
+            
+            if base_domains:
+                # Insert all websites in one statement (account_id scoped)
+                inserted_websites = execute_values(self.cursor, """
+                    INSERT INTO websites (account_id, base_domain, display_name, created_at)
+                    VALUES %s
+                    ON CONFLICT (account_id, base_domain) DO NOTHING
+                    RETURNING id, base_domain
+                """, [(account_id, domain, domain) for domain in base_domains],
+                    template="(%s, %s, %s, NOW())", page_size=1000, fetch=True)
                 
-                # Insert website
-                website_id = self.insert_website(account_id, base_domain)
+                for row in inserted_websites:
+                    print(f"[INSERT] Website: {row['base_domain']} (id: {row['id']})")
                 
-                if not website_id:
-                    raise RuntimeError(f"Failed to get website_id for {base_domain}")
+                # Resolve ids for new and pre-existing websites of THIS account
+                self.cursor.execute("""
+                    SELECT id, base_domain FROM websites
+                    WHERE account_id = %s AND base_domain = ANY(%s)
+                """, (account_id, base_domains))
+                website_ids = {row['base_domain']: row['id'] for row in self.cursor.fetchall()}
                 
-                # Insert properties for this website
-                for prop in properties:
-                    site_url = prop.get('siteUrl', '')
-                    permission_level = prop.get('permissionLevel', '')
+                property_rows = []
+                for base_domain in base_domains:
+                    website_id = website_ids.get(base_domain)
                     
-                    # Determine property type
-                    if site_url.startswith('sc-domain:'):
-                        property_type = 'sc_domain'
-                    else:
-                        property_type = 'url_prefix'
+                    if not website_id:
+                        raise RuntimeError(f"Failed to get website_id for {base_domain}")
                     
-                    property_id = self.insert_property(
-                        account_id=account_id,
-                        website_id=website_id,
-                        site_url=site_url,
-                        property_type=property_type,
-                        permission_level=permission_level
-                    )
+                    for prop in grouped_properties[base_domain]:
+                        site_url = prop.get('siteUrl', '')
+                        permission_level = prop.get('permissionLevel', '')
+                        
+                        # Determine property type
+                        if site_url.startswith('sc-domain:'):
+                            property_type = 'sc_domain'
+                        else:
+                            property_type = 'url_prefix'
+                        
+                        property_rows.append(
+                            (account_id, website_id, site_url, property_type, permission_level)
+                        )
+                
+                if property_rows:
+                    # Insert all properties in one statement (account_id scoped)
+                    inserted_properties = execute_values(self.cursor, """
+                        INSERT INTO properties (account_id, website_id, site_url, property_type, permission_level, created_at)
+                        VALUES %s
+                        ON CONFLICT (account_id, site_url) DO NOTHING
+                        RETURNING id, site_url
+                    """, property_rows, template="(%s, %s, %s, %s, %s, NOW())", page_size=1000, fetch=True)
                     
-                    if not property_id:
-                        raise RuntimeError(f"Failed to get property_id for {site_url}")
+                    for row in inserted_properties:
+                        print(f"[INSERT] Property: {row['site_url']} (id: {row['id']})")
             
             # Commit transaction
             self.commit_transaction()
             
             # Get final counts for this account
-            self.cursor.execute("SELECT COUNT(*) as count FROM websites WHERE account_id = %s", (account_id,))
-            total_websites = self.cursor.fetchone()['count']
-            
-            self.cursor.execute("SELECT COUNT(*) as count FROM properties WHERE account_id = %s", (account_id,))
-            total_properties = self.cursor.fetchone()['count']
+            self.cursor.execute("""
+                SELECT
+                    (SELECT COUNT(*) FROM websites WHERE account_id = %s) as websites,
+                    (SELECT COUNT(*) FROM properties WHERE account_id = %s) as properties
+            """, (account_id, account_id))
+            counts = self.cursor.fetchone()
             
             return {
-                'websites': total_websites,
-                'properties': total_properties
+                'websites': counts['websites'],
+                'properties': counts['properties']
             }
         
         except Exception as e:
@@ -602,51 +880,39 @@ class DatabasePersistence:
             self.rollback_transaction()
             raise RuntimeError(f"Persistence failed: {e}") from e
     
-    def persist_property_metrics(self, property_id: str, property_metrics: List[Dict[str, Any]]) -> Dict[str, int]:
+    def persist_property_metrics(self, property_id: str, property_metrics: List[tuple]) -> Dict[str, int]:
         """
         Insert or update property-level metrics (site-wide aggregate).
         Aligns with schema: ON CONFLICT (property_id, date)
         
         Args:
             property_id: UUID of the property
-            property_metrics: List of dicts with: date, clicks, impressions, ctr, position
+            property_metrics: Row tuples in column order:
+                (property_id, date, clicks, impressions, ctr, position)
         """
         if not property_metrics:
             return {'inserted': 0, 'updated': 0}
             
-        inserted_count = 0
-        updated_count = 0
+        # Already insert-ready; handed to execute_values as-is
+        rows = property_metrics
         
         try:
-            for metric in property_metrics:
-                self.cursor.execute("""
-                    INSERT INTO property_daily_metrics 
-                        (property_id, date, clicks, impressions, ctr, position, created_at)
-                    VALUES 
-                        (%s, %s, %s, %s, %s, %s, NOW())
-                    ON CONFLICT (property_id, date) 
-                    DO UPDATE SET
-                        clicks = EXCLUDED.clicks,
-                        impressions = EXCLUDED.impressions,
-                        ctr = EXCLUDED.ctr,
-                        position = EXCLUDED.position
-                    RETURNING (xmax = 0) AS inserted
-                """, (
-                    property_id,
-                    metric['date'],
-                    metric.get('clicks', 0),
-                    metric.get('impressions', 0),
-                    metric.get('ctr', 0.0),
-                    metric.get('position', 0.0)
-                ))
-                
-                result = self.cursor.fetchone()
-                if result and result['inserted']:
-                    inserted_count += 1
-                else:
-                    updated_count += 1
-                    
-            return {'inserted': inserted_count, 'updated': updated_count}
+            # One multi-row INSERT per page instead of one round-trip per row
+            results = execute_values(self.cursor, """
+                INSERT INTO property_daily_metrics 
+                    (property_id, date, clicks, impressions, ctr, position, created_at)
+                VALUES %s
+                ON CONFLICT (property_id, date) 
+                DO UPDATE SET
+                    clicks = EXCLUDED.clicks,
+                    impressions = EXCLUDED.impressions,
+                    ctr = EXCLUDED.ctr,
+                    position = EXCLUDED.position
+                RETURNING (xmax = 0) AS inserted
+            """, rows, template="(%s, %s, %s, %s, %s, %s, NOW())", page_size=1000, fetch=True)
+            
+            inserted_count = sum(1 for result in results if result['inserted'])
+            return {'inserted': inserted_count, 'updated': len(results) - inserted_count}
         except psycopg2.Error as e:
             print(f"[ERROR] Failed to persist property metrics: {e}")
             raise RuntimeError(f"Database error persisting property metrics: {e}") from e
@@ -662,21 +928,22 @@ class DatabasePersistence:
             List of dictionaries with: id, site_url, base_domain, property_type, permission_level
         """
         try:
-            self.cursor.execute("""
-                SELECT 
-                    p.id,
-                    p.site_url,
-                    p.property_type,
-                    p.permission_level,
-                    w.base_domain
-                FROM properties p
-                JOIN websites w ON p.website_id = w.id
-                WHERE p.account_id = %s
-                ORDER BY w.base_domain, p.site_url
-            """, (account_id,))
-            
-            properties = self.cursor.fetchall()
-            return [dict(prop) for prop in properties]
+            # Plain tuple cursor: one plain dict per row, no RealDictRow copy
+            with self.connection.cursor() as cur:
+                cur.execute("""
+                    SELECT 
+                        p.id,
+                        p.site_url,
+                        p.property_type,
+                        p.permission_level,
+                        w.base_domain
+                    FROM properties p
+                    JOIN websites w ON p.website_id = w.id
+                    WHERE p.account_id = %s
+                    ORDER BY w.base_domain, p.site_url
+                """, (account_id,))
+                
+                return _rows_to_dicts(cur, cur.fetchall())
         
         except psycopg2.Error as e:
             print(f"[ERROR] Failed to fetch properties for account {account_id}: {e}")
@@ -704,17 +971,36 @@ class DatabasePersistence:
             """, (property_id, account_id))
 
             row = self.cursor.fetchone()
+            if row:
+                _OWNED_PROPERTIES.add((account_id, property_id))
             return dict(row) if row else None
 
         except psycopg2.Error as e:
             print(f"[ERROR] Failed to fetch property {property_id} for account {account_id}: {e}")
             raise RuntimeError(f"Database error fetching property: {e}") from e
     
+    def _property_belongs_to_account(self, account_id: str, property_id: str) -> bool:
+        """
+        Ownership guard for the analytics reads, so their metric queries can
+        filter on property_id alone. Positive results are cached process-wide.
+        """
+        if (account_id, property_id) in _OWNED_PROPERTIES:
+            return True
+        
+        self.cursor.execute("""
+            SELECT 1 FROM properties WHERE id = %s AND account_id = %s
+        """, (property_id, account_id))
+        
+        if self.cursor.fetchone() is None:
+            return False
+        _OWNED_PROPERTIES.add((account_id, property_id))
+        return True
+    
     # ========================================
     # PHASE 5: PAGE METRICS PERSISTENCE
     # ========================================
     
-    def persist_page_metrics(self, property_id: str, page_metrics: List[Dict[str, Any]], 
+    def persist_page_metrics(self, property_id: str, page_metrics: List[tuple], 
                             show_progress: bool = False) -> Dict[str, int]:
         """
         Insert or update page metrics for a property using batch inserts
@@ -722,7 +1008,8 @@ class DatabasePersistence:
         
         Args:
             property_id: UUID of the property
-            page_metrics: List of dicts with keys: page_url, date, clicks, impressions, ctr, position
+            page_metrics: Row tuples in column order:
+                (property_id, page_url, date, clicks, impressions)
             show_progress: If True, log progress every 500 rows (for backfill)
         
         Returns:
@@ -735,37 +1022,20 @@ class DatabasePersistence:
         batch_size = 500
         
         try:
-            # Prepare SQL for batch insert
-            insert_sql = """
-                INSERT INTO page_daily_metrics 
-                    (property_id, page_url, date, clicks, impressions, created_at, updated_at)
-                VALUES 
-                    (%s, %s, %s, %s, %s, NOW(), NOW())
-                ON CONFLICT (property_id, page_url, date) 
-                DO UPDATE SET
-                    clicks = EXCLUDED.clicks,
-                    impressions = EXCLUDED.impressions,
-                    updated_at = NOW()
-            """
-            
-            # Process in batches
+            # One multi-row INSERT per batch instead of one EXECUTE per row
             for i in range(0, total_rows, batch_size):
-                batch = page_metrics[i:i + batch_size]
+                batch_data = page_metrics[i:i + batch_size]
                 
-                # Prepare batch data
-                batch_data = [
-                    (
-                        property_id,
-                        metric['page_url'],
-                        metric['date'],
-                        metric['clicks'],
-                        metric['impressions']
-                    )
-                    for metric in batch
-                ]
-                
-                # Execute batch insert
-                execute_batch(self.cursor, insert_sql, batch_data, page_size=batch_size)
+                execute_values(self.cursor, """
+                    INSERT INTO page_daily_metrics 
+                        (property_id, page_url, date, clicks, impressions, created_at, updated_at)
+                    VALUES %s
+                    ON CONFLICT (property_id, page_url, date) 
+                    DO UPDATE SET
+                        clicks = EXCLUDED.clicks,
+                        impressions = EXCLUDED.impressions,
+                        updated_at = NOW()
+                """, batch_data, template="(%s, %s, %s, %s, %s, NOW(), NOW())", page_size=batch_size)
                 
                 # Log progress if requested
                 if show_progress:
@@ -780,137 +1050,225 @@ class DatabasePersistence:
             print(f"[ERROR] Failed to persist page metrics: {e}")
             raise RuntimeError(f"Database error persisting page metrics: {e}") from e
     
-    def fetch_page_metrics_for_analysis(self, account_id: str, property_id: str) -> List[Dict[str, Any]]:
+    def fetch_page_window_bounds(self, account_id: str, property_id: str) -> Optional[Tuple[date, int, int]]:
         """
-        Fetch page impressions for V1 visibility analysis.
-        Only fetches: page_url, date, impressions
-        
-        Uses MAX(date) lookback logic to handle GSC lag correctly,
-    ensuring we always get complete analysis windows.
+        Summarize the page-metric analysis window for V1 visibility analysis.
+        The window is the ANALYSIS_WINDOW_DAYS ending at MAX(date), which
+        handles GSC lag correctly.
         
         Args:
             account_id: UUID of the account
             property_id: UUID of the property
         
         Returns:
-            List of dicts with: page_url, date, impressions
+            (most recent date, distinct days in window, page-date rows in window),
+            or None if the property has no page metrics
         """
         try:
-            self.cursor.execute("""
-                SELECT 
-                    m.page_url,
-                    m.date,
-                    m.impressions,
-                    m.clicks
-                FROM page_daily_metrics m
-                JOIN properties p ON m.property_id = p.id
-                WHERE m.property_id = %s
-                  AND p.account_id = %s
-                  AND m.date >= (
-                      SELECT MAX(m2.date) - INTERVAL '13 days'
-                      FROM page_daily_metrics m2
-                      JOIN properties p2 ON m2.property_id = p2.id
-                      WHERE m2.property_id = %s
-                        AND p2.account_id = %s
-                  )
-                ORDER BY m.date DESC, m.page_url
-            """, (property_id, account_id, property_id, account_id))
+            if not self._property_belongs_to_account(account_id, property_id):
+                return None
             
-            metrics = self.cursor.fetchall()
-            return [dict(metric) for metric in metrics]
+            with self.connection.cursor() as cur:
+                cur.execute("""
+                    WITH bounds AS (
+                        SELECT MAX(date) AS max_date
+                        FROM page_daily_metrics
+                        WHERE property_id = %s
+                    )
+                    SELECT b.max_date, COUNT(DISTINCT m.date), COUNT(*)
+                    FROM page_daily_metrics m, bounds b
+                    WHERE m.property_id = %s
+                      AND m.date >= b.max_date - %s
+                    GROUP BY b.max_date
+                """, (property_id, property_id, ANALYSIS_WINDOW_DAYS - 1))
+                
+                return cur.fetchone()
         
         except psycopg2.Error as e:
-            print(f"[ERROR] Failed to fetch page metrics for prop {property_id}: {e}")
+            print(f"[ERROR] Failed to fetch page metric bounds for prop {property_id}: {e}")
             raise RuntimeError(f"Database error fetching page metrics: {e}") from e
     
-    def get_page_metrics_count(self, property_id: str) -> int:
+    def fetch_page_window_sums(
+        self,
+        account_id: str,
+        property_id: str,
+        most_recent_date: date
+    ) -> Tuple[Dict[str, Tuple[int, int]], Dict[str, Tuple[int, int]]]:
         """
-        Get total count of page metric rows for a property
-        Used to detect if backfill is needed
+        Per-page impressions and clicks for last_7 and prev_7, summed in SQL
+        so one row per page crosses the wire instead of one per page-day.
         
         Args:
+            account_id: UUID of the account
             property_id: UUID of the property
+            most_recent_date: Window anchor from fetch_page_window_bounds
         
         Returns:
-            Total number of page-date rows
+            Tuple of (last_sums, prev_sums) - page_url -> (impressions, clicks).
+            A page is a key only if it has rows in that window.
         """
+        if not self._property_belongs_to_account(account_id, property_id):
+            return ({}, {})
+        
+        last_start = most_recent_date - timedelta(days=HALF_ANALYSIS_WINDOW - 1)
+        prev_start = most_recent_date - timedelta(days=ANALYSIS_WINDOW_DAYS - 1)
+        
         try:
-            self.cursor.execute("""
-                SELECT COUNT(*) as count
-                FROM page_daily_metrics
-                WHERE property_id = %s
-            """, (property_id,))
-            
-            result = self.cursor.fetchone()
-            return result['count'] if result else 0
+            with self.connection.cursor() as cur:
+                cur.execute("""
+                    SELECT
+                        page_url,
+                        COUNT(*) FILTER (WHERE date >= %(last_start)s),
+                        COALESCE(SUM(impressions) FILTER (WHERE date >= %(last_start)s), 0),
+                        COALESCE(SUM(clicks) FILTER (WHERE date >= %(last_start)s), 0),
+                        COUNT(*) FILTER (WHERE date < %(last_start)s),
+                        COALESCE(SUM(impressions) FILTER (WHERE date < %(last_start)s), 0),
+                        COALESCE(SUM(clicks) FILTER (WHERE date < %(last_start)s), 0)
+                    FROM page_daily_metrics
+                    WHERE property_id = %(property_id)s
+                      AND date BETWEEN %(prev_start)s AND %(end)s
+                    GROUP BY page_url
+                """, {
+                    'property_id': property_id,
+                    'last_start': last_start,
+                    'prev_start': prev_start,
+                    'end': most_recent_date
+                })
+                
+                last_sums = {}
+                prev_sums = {}
+                for page_url, last_days, last_imps, last_clicks, prev_days, prev_imps, prev_clicks in cur:
+                    if last_days:
+                        last_sums[page_url] = (last_imps, last_clicks)
+                    if prev_days:
+                        prev_sums[page_url] = (prev_imps, prev_clicks)
+                
+                return (last_sums, prev_sums)
         
         except psycopg2.Error as e:
-            print(f"[ERROR] Failed to count page metrics: {e}")
-            raise RuntimeError(f"Database error counting page metrics: {e}") from e
+            print(f"[ERROR] Failed to fetch page window sums for prop {property_id}: {e}")
+            raise RuntimeError(f"Database error fetching page metrics: {e}") from e
     
     # ========================================
     # PHASE 6: DEVICE METRICS PERSISTENCE
     # ========================================
     
-    def persist_device_metrics(self, property_id: str, device_metrics: List[Dict[str, Any]]) -> Dict[str, int]:
+    def persist_device_metrics(self, property_id: str, device_metrics: List[tuple]) -> Dict[str, int]:
         """
         Insert or update device metrics for a property
-        Uses ON CONFLICT DO UPDATE to handle GSC data revisions
+        Uses ON CONFLICT DO UPDATE to handle GSC data revisions; rows whose
+        values are identical to the stored ones are left untouched (no write).
+        Commit with commit_transaction so the property's cached analysis
+        window is dropped after the rows become visible.
         
         Args:
             property_id: UUID of the property
-            device_metrics: List of dicts with keys: device, date, clicks, impressions, ctr, position
+            device_metrics: Row tuples in column order:
+                (property_id, device, date, clicks, impressions, ctr, position)
         
         Returns:
-            Dictionary with counts: {'inserted': N, 'updated': M}
+            Dictionary with counts: {'inserted': N, 'updated': M, 'unchanged': K}
         """
         if not device_metrics:
-            return {'inserted': 0, 'updated': 0}
+            return {'inserted': 0, 'updated': 0, 'unchanged': 0}
         
-        inserted_count = 0
-        updated_count = 0
+        # Invalidated by commit_transaction once these rows are visible
+        self._stale_cache_keys.append((_device_window_cache, property_id))
+        
+        # Already insert-ready; handed to execute_values / COPY as-is
+        rows = device_metrics
+        
+        if len(rows) > DEVICE_METRICS_COPY_THRESHOLD:
+            return self._copy_device_metrics(rows)
         
         try:
-            for metric in device_metrics:
-                # Insert with ON CONFLICT DO UPDATE
-                self.cursor.execute("""
-                    INSERT INTO device_daily_metrics 
-                        (property_id, device, date, clicks, impressions, ctr, position, created_at, updated_at)
-                    VALUES 
-                        (%s, %s, %s, %s, %s, %s, %s, NOW(), NOW())
-                    ON CONFLICT (property_id, device, date) 
-                    DO UPDATE SET
-                        clicks = EXCLUDED.clicks,
-                        impressions = EXCLUDED.impressions,
-                        ctr = EXCLUDED.ctr,
-                        position = EXCLUDED.position,
-                        updated_at = NOW()
-                    RETURNING (xmax = 0) AS inserted
-                """, (
-                    property_id,
-                    metric['device'],
-                    metric['date'],
-                    metric['clicks'],
-                    metric['impressions'],
-                    metric['ctr'],
-                    metric['position']
-                ))
-                
-                result = self.cursor.fetchone()
-                if result and result['inserted']:
-                    inserted_count += 1
-                else:
-                    updated_count += 1
+            # One multi-row INSERT per page instead of one round-trip per row
+            results = execute_values(self.cursor, """
+                INSERT INTO device_daily_metrics 
+                    (property_id, device, date, clicks, impressions, ctr, position, created_at, updated_at)
+                VALUES %s
+                ON CONFLICT (property_id, device, date) 
+                DO UPDATE SET
+                    clicks = EXCLUDED.clicks,
+                    impressions = EXCLUDED.impressions,
+                    ctr = EXCLUDED.ctr,
+                    position = EXCLUDED.position,
+                    updated_at = NOW()
+                WHERE device_daily_metrics.clicks IS DISTINCT FROM EXCLUDED.clicks
+                   OR device_daily_metrics.impressions IS DISTINCT FROM EXCLUDED.impressions
+                   OR device_daily_metrics.ctr IS DISTINCT FROM EXCLUDED.ctr
+                   OR device_daily_metrics.position IS DISTINCT FROM EXCLUDED.position
+                RETURNING (xmax = 0) AS inserted
+            """, rows, template="(%s, %s, %s, %s, %s, %s, %s, NOW(), NOW())", page_size=500, fetch=True)
             
-            return {
-                'inserted': inserted_count,
-                'updated': updated_count
-            }
+            return self._tally_device_upsert(rows, results)
         
         except psycopg2.Error as e:
             print(f"[ERROR] Failed to persist device metrics: {e}")
             raise RuntimeError(f"Database error persisting device metrics: {e}") from e
     
+    @staticmethod
+    def _tally_device_upsert(rows: List[tuple], results: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Count upsert outcomes. Rows whose values already matched are skipped by
+        the IS DISTINCT FROM guard and return nothing, so they are the remainder.
+        """
+        inserted_count = sum(1 for result in results if result['inserted'])
+        return {
+            'inserted': inserted_count,
+            'updated': len(results) - inserted_count,
+            'unchanged': len(rows) - len(results)
+        }
+    
+    def _copy_device_metrics(self, rows: List[tuple]) -> Dict[str, int]:
+        """
+        Bulk path for persist_device_metrics (large backfills).
+        
+        COPYs the rows into a session temp table, then merges them with a single
+        INSERT ... SELECT ... ON CONFLICT DO UPDATE. The staging table is created
+        once per pooled connection and emptied on every commit.
+        """
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        
+        try:
+            self.cursor.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS _stage_dm
+                    (LIKE device_daily_metrics INCLUDING DEFAULTS)
+                    ON COMMIT DELETE ROWS
+            """)
+            self.cursor.execute("TRUNCATE _stage_dm")
+            self.cursor.copy_expert(
+                "COPY _stage_dm (property_id, device, date, clicks, impressions, ctr, position) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+            self.cursor.execute("""
+                INSERT INTO device_daily_metrics 
+                    (property_id, device, date, clicks, impressions, ctr, position, created_at, updated_at)
+                SELECT property_id, device, date, clicks, impressions, ctr, position, NOW(), NOW()
+                FROM _stage_dm
+                ON CONFLICT (property_id, device, date) 
+                DO UPDATE SET
+                    clicks = EXCLUDED.clicks,
+                    impressions = EXCLUDED.impressions,
+                    ctr = EXCLUDED.ctr,
+                    position = EXCLUDED.position,
+                    updated_at = NOW()
+                WHERE device_daily_metrics.clicks IS DISTINCT FROM EXCLUDED.clicks
+                   OR device_daily_metrics.impressions IS DISTINCT FROM EXCLUDED.impressions
+                   OR device_daily_metrics.ctr IS DISTINCT FROM EXCLUDED.ctr
+                   OR device_daily_metrics.position IS DISTINCT FROM EXCLUDED.position
+                RETURNING (xmax = 0) AS inserted
+            """)
+            
+            return self._tally_device_upsert(rows, self.cursor.fetchall())
+        
+        except psycopg2.Error as e:
+            print(f"[ERROR] Failed to COPY device metrics: {e}")
+            raise RuntimeError(f"Database error persisting device metrics: {e}") from e
+    
     def fetch_device_metrics_for_analysis(self, account_id: str, property_id: str) -> List[Dict[str, Any]]:
         """
         Fetch metrics required for device visibility analysis.
@@ -931,35 +1289,86 @@ class DatabasePersistence:
             # To handle GSC lag, we anchor the window to the latest available date.
             lookback_days = ANALYSIS_WINDOW_DAYS - 1
             
-            self.cursor.execute(f"""
-                SELECT 
-                    m.device,
-                    m.date,
-                    m.clicks,
-                    m.impressions,
-                    m.ctr,
-                    m.position
-                FROM device_daily_metrics m
-                JOIN properties p ON m.property_id = p.id
-                WHERE m.property_id = %s
-                  AND p.account_id = %s
-                  AND m.date >= (
-                      SELECT MAX(m2.date) - INTERVAL '%s days'
-                      FROM device_daily_metrics m2
-                      JOIN properties p2 ON m2.property_id = p2.id
-                      WHERE m2.property_id = %s
-                        AND p2.account_id = %s
-                  )
-                ORDER BY m.date DESC, m.device
-            """, (property_id, account_id, lookback_days, property_id, account_id))
+            if not self._property_belongs_to_account(account_id, property_id):
+                return []
+            
+            cached = _cache_get(_device_window_cache, property_id)
+            if cached is not None:
+                return list(cached)
+            
+            # Plain tuple cursor: one plain dict per row, no RealDictRow copy
+            with self.connection.cursor() as cur:
+                self._execute_prepared(
+                    'fetch_device_metrics_for_analysis', (property_id, lookback_days), cursor=cur
+                )
+                metrics = _rows_to_dicts(cur, cur.fetchall())
             
-            metrics = self.cursor.fetchall()
-            return [dict(row) for row in metrics]
+            # Cached as a tuple so the shared rows can't be appended to or reordered
+            _cache_put(_device_window_cache, property_id, tuple(metrics))
+            return metrics
         
         except psycopg2.Error as e:
             print(f"[ERROR] Failed to fetch device metrics: {e}")
             raise RuntimeError(f"Database error fetching device metrics: {e}") from e
 
+    def fetch_device_metrics_for_analysis_bulk(self, account_id: str, property_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Batch version of fetch_device_metrics_for_analysis: one query for many
+        properties, each anchored to its own MAX(date).
+        
+        Args:
+            account_id: UUID of the account (properties outside it are ignored)
+            property_ids: UUIDs of the properties
+        
+        Returns:
+            Dict property_id -> list of dicts with device, date, clicks,
+            impressions, ctr, position (properties without rows are absent)
+        """
+        if not self.connection or not self.cursor:
+            raise RuntimeError("Database connection not established")
+        
+        if not property_ids:
+            return {}
+        
+        try:
+            lookback_days = ANALYSIS_WINDOW_DAYS - 1
+            
+            # 🔐 BATCH QUERY: Anchored MAX(date) per property, scoped to the account
+            with self.connection.cursor() as cur:
+                cur.execute("""
+                    WITH property_dates AS (
+                        SELECT m.property_id, MAX(m.date) AS max_date
+                        FROM device_daily_metrics m
+                        JOIN properties p ON m.property_id = p.id
+                        WHERE p.account_id = %s
+                          AND m.property_id = ANY(%s::uuid[])
+                        GROUP BY m.property_id
+                    )
+                    SELECT 
+                        m.property_id,
+                        m.device,
+                        m.date,
+                        m.clicks,
+                        m.impressions,
+                        m.ctr,
+                        m.position
+                    FROM device_daily_metrics m
+                    JOIN property_dates pd ON m.property_id = pd.property_id
+                    WHERE m.date >= pd.max_date - (%s * INTERVAL '1 day')
+                    ORDER BY m.property_id, m.device, m.date DESC
+                """, (account_id, list(property_ids), lookback_days))
+                
+                rows = _rows_to_dicts(cur, cur.fetchall())
+            
+            return {
+                property_id: list(group)
+                for property_id, group in groupby(rows, key=itemgetter('property_id'))
+            }
+        
+        except psycopg2.Error as e:
+            print(f"[ERROR] Failed to batch fetch device metrics for account {account_id}: {e}")
+            raise RuntimeError(f"Database error batch fetching device metrics: {e}") from e
+
 
 
 
@@ -984,17 +1393,13 @@ class DatabasePersistence:
             raise RuntimeError("Database connection not established")
         
         try:
+            # property_count is maintained by the properties_count_* triggers;
+            # served straight from websites_account_domain_unique in order
             self.cursor.execute("""
-                SELECT 
-                    w.id,
-                    w.base_domain,
-                    w.created_at,
-                    COUNT(p.id) as property_count
-                FROM websites w
-                LEFT JOIN properties p ON w.id = p.website_id
-                WHERE w.account_id = %s
-                GROUP BY w.id, w.base_domain, w.created_at
-                ORDER BY w.base_domain
+                SELECT id, base_domain, created_at, property_count
+                FROM websites
+                WHERE account_id = %s
+                ORDER BY base_domain
             """, (account_id,))
             
             websites = self.cursor.fetchall()
@@ -1040,6 +1445,46 @@ class DatabasePersistence:
             raise RuntimeError(f"Database error fetching properties: {e}") from e
 
 
+    def fetch_properties_grouped_by_website(self, account_id: str) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Fetch every property of an account in one query, grouped by website.
+        Same rows and ordering as calling fetch_properties_by_website per website.
+        
+        Args:
+            account_id: UUID of the account
+        
+        Returns:
+            Dict mapping website_id -> list of dicts with:
+            id, site_url, property_type, permission_level, created_at
+        """
+        if not self.connection or not self.cursor:
+            raise RuntimeError("Database connection not established")
+        
+        try:
+            self.cursor.execute("""
+                SELECT 
+                    website_id,
+                    id,
+                    site_url,
+                    property_type,
+                    permission_level,
+                    created_at
+                FROM properties
+                WHERE account_id = %s
+                ORDER BY website_id, site_url
+            """, (account_id,))
+            
+            grouped: Dict[str, List[Dict[str, Any]]] = {}
+            for row in self.cursor.fetchall():
+                prop = dict(row)
+                grouped.setdefault(prop.pop('website_id'), []).append(prop)
+            return grouped
+        
+        except psycopg2.Error as e:
+            print(f"[ERROR] Failed to fetch properties for account {account_id}: {e}")
+            raise RuntimeError(f"Database error fetching properties: {e}") from e
+
+
     def fetch_property_daily_metrics_for_overview(self, account_id: str, property_id: str) -> List[Dict[str, Any]]:
         """
         Fetch precisely ANALYSIS_WINDOW_DAYS of property metrics anchored to MAX(date).
@@ -1057,78 +1502,277 @@ class DatabasePersistence:
         try:
             lookback_days = ANALYSIS_WINDOW_DAYS - 1
             
-            self.cursor.execute(f"""
-                SELECT 
-                    m.date,
-                    m.clicks,
-                    m.impressions,
-                    m.ctr,
-                    m.position
-                FROM property_daily_metrics m
-                JOIN properties p ON m.property_id = p.id
-                WHERE m.property_id = %s AND p.account_id = %s
-                  AND m.date >= (
-                      SELECT MAX(date) - INTERVAL '%s days'
-                      FROM property_daily_metrics
-                      WHERE property_id = %s
-                  )
-                ORDER BY m.date DESC
-            """, (property_id, account_id, lookback_days, property_id))
+            if not self._property_belongs_to_account(account_id, property_id):
+                return []
             
-            metrics = self.cursor.fetchall()
-            return [dict(row) for row in metrics]
+            # Plain tuple cursor: one plain dict per row, no RealDictRow copy
+            with self.connection.cursor() as cur:
+                cur.execute("""
+                    WITH bounds AS (
+                        SELECT MAX(date) AS max_date
+                        FROM property_daily_metrics
+                        WHERE property_id = %s
+                    )
+                    SELECT 
+                        m.date,
+                        m.clicks,
+                        m.impressions,
+                        m.ctr,
+                        m.position
+                    FROM property_daily_metrics m, bounds b
+                    WHERE m.property_id = %s
+                      AND m.date >= b.max_date - (%s * INTERVAL '1 day')
+                    ORDER BY m.date DESC
+                """, (property_id, property_id, lookback_days))
+
+                return _rows_to_dicts(cur, cur.fetchall())
         
         except psycopg2.Error as e:
             print(f"[ERROR] Failed to fetch property metrics for prop {property_id}: {e}")
             raise RuntimeError(f"Database error fetching property metrics: {e}") from e
 
 
-    def fetch_all_property_metrics_for_account(self, account_id: str) -> List[Dict[str, Any]]:
+    def fetch_latest_metric_dates(self, account_id: str, property_ids: List[str]) -> Dict[str, date]:
+        """
+        Most recent property_daily_metrics date for each property, in one query.
+        
+        Args:
+            account_id: UUID of the account (properties outside it are ignored)
+            property_ids: UUIDs of the properties
+        
+        Returns:
+            Dict property_id -> MAX(date) (properties without rows are absent)
+        """
+        if not self.connection or not self.cursor:
+            raise RuntimeError("Database connection not established")
+        
+        if not property_ids:
+            return {}
+        
+        try:
+            with self.connection.cursor() as cur:
+                cur.execute("""
+                    SELECT m.property_id, MAX(m.date)
+                    FROM property_daily_metrics m
+                    JOIN properties p ON m.property_id = p.id
+                    WHERE p.account_id = %s
+                      AND m.property_id = ANY(%s::uuid[])
+                    GROUP BY m.property_id
+                """, (account_id, list(property_ids)))
+                
+                return dict(cur.fetchall())
+        
+        except psycopg2.Error as e:
+            print(f"[ERROR] Failed to fetch latest metric dates for {len(property_ids)} properties: {e}")
+            raise RuntimeError(f"Database error fetching latest metric dates: {e}") from e
+
+
+    def fetch_properties_ingested(
+        self,
+        account_id: str,
+        property_ids: List[str],
+        start_date: date,
+        end_date: date
+    ) -> Set[str]:
+        """
+        Properties whose property, page and device ingests are all recorded
+        in ingestion_log for every day from start_date to end_date, in one
+        query. Lets a re-run skip API calls for days already ingested.
+        
+        Args:
+            account_id: UUID of the account (properties outside it are ignored)
+            property_ids: UUIDs of the properties
+            start_date: First day to check
+            end_date: Last day to check
+        
+        Returns:
+            Set of property_ids with every (metric_type, day) pair logged
+        """
+        if not self.connection or not self.cursor:
+            raise RuntimeError("Database connection not established")
+        
+        if not property_ids:
+            return set()
+        
+        try:
+            with self.connection.cursor() as cur:
+                cur.execute("""
+                    SELECT l.property_id
+                    FROM ingestion_log l
+                    JOIN properties p ON l.property_id = p.id
+                    WHERE p.account_id = %(account_id)s
+                      AND l.property_id = ANY(%(property_ids)s::uuid[])
+                      AND l.metric_type = ANY(%(metric_types)s)
+                      AND l.date BETWEEN %(start_date)s AND %(end_date)s
+                    GROUP BY l.property_id
+                    HAVING COUNT(*) = %(expected)s
+                """, {
+                    'account_id': account_id,
+                    'property_ids': list(property_ids),
+                    'metric_types': list(INGESTION_METRIC_TYPES),
+                    'start_date': start_date,
+                    'end_date': end_date,
+                    'expected': len(INGESTION_METRIC_TYPES) * ((end_date - start_date).days + 1)
+                })
+                
+                return {str(row[0]) for row in cur.fetchall()}
+        
+        except psycopg2.Error as e:
+            print(f"[ERROR] Failed to fetch ingested properties for {start_date} to {end_date}: {e}")
+            raise RuntimeError(f"Database error fetching ingested properties: {e}") from e
+
+    def mark_ingested(self, property_id: str, metric_type: str, dates: Iterable[Any]) -> None:
+        """
+        Record that one metric type's ingest committed rows for these days,
+        one ingestion_log row per day, in one INSERT and one commit.
+        Call only after the ingest itself succeeded: a partial ingest must
+        leave no rows, so fetch_properties_ingested does not skip it.
+        
+        Args:
+            property_id: UUID of the property
+            metric_type: One of INGESTION_METRIC_TYPES
+            dates: Days (date or 'YYYY-MM-DD') GSC returned rows for
+        """
+        if not self.connection or not self.cursor:
+            raise RuntimeError("Database connection not established")
+        
+        dates = sorted({str(d) for d in dates})
+        if not dates:
+            return
+        
+        try:
+            self.cursor.execute("""
+                INSERT INTO ingestion_log (property_id, metric_type, date)
+                SELECT %s, %s, d
+                FROM unnest(%s::date[]) AS d
+                ON CONFLICT (property_id, metric_type, date) DO UPDATE
+                SET ingested_at = NOW()
+            """, (property_id, metric_type, dates))
+            self.connection.commit()
+        except psycopg2.Error as e:
+            self.connection.rollback()
+            print(f"[ERROR] Failed to log {metric_type} ingest for {property_id}: {e}")
+            raise RuntimeError(f"Database error logging ingest: {e}") from e
+
+    def fetch_property_window_totals(self, account_id: str) -> Dict[str, Dict[str, Any]]:
         """
-        Fetch metrics for ALL properties of an account in a single batch query.
-        Uses a CTE to anchor MAX(date) per property for canonical window slicing.
+        Sum last_7 / prev_7 clicks and impressions for ALL properties of an
+        account in one aggregate query, instead of shipping every property's
+        14 daily rows to Python. Windows are anchored to each property's
+        MAX(date), matching split_rows_by_window (0-6 days ago vs 7-13 days ago).
         
         Args:
             account_id: UUID of the account
             
         Returns:
-            List of dicts with: property_id, date, clicks, impressions, ctr, position
+            Dict mapping property_id -> {'data_through', 'last_7_clicks',
+            'last_7_impressions', 'prev_7_clicks', 'prev_7_impressions'}.
+            Properties with no metrics are absent.
         """
         if not self.connection or not self.cursor:
             raise RuntimeError("Database connection not established")
         
         try:
-            # We fetch ANALYSIS_WINDOW_DAYS of history per property
-            lookback_days = ANALYSIS_WINDOW_DAYS - 1
+            # 🔐 BATCH QUERY: one row per property instead of the full 14-day window
+            # MAX(date) per property first, so only the 14-day window is read
+            # from each property's index range rather than its whole history
+            self.cursor.execute("""
+                WITH property_dates AS (
+                    SELECT m.property_id, MAX(m.date) AS max_date
+                    FROM property_daily_metrics m
+                    JOIN properties p ON m.property_id = p.id
+                    WHERE p.account_id = %(account_id)s
+                    GROUP BY m.property_id
+                )
+                SELECT 
+                    m.property_id,
+                    pd.max_date AS data_through,
+                    COALESCE(SUM(m.clicks) FILTER (WHERE m.date > pd.max_date - %(half)s), 0) AS last_7_clicks,
+                    COALESCE(SUM(m.impressions) FILTER (WHERE m.date > pd.max_date - %(half)s), 0) AS last_7_impressions,
+                    COALESCE(SUM(m.clicks) FILTER (WHERE m.date <= pd.max_date - %(half)s), 0) AS prev_7_clicks,
+                    COALESCE(SUM(m.impressions) FILTER (WHERE m.date <= pd.max_date - %(half)s), 0) AS prev_7_impressions
+                FROM property_daily_metrics m
+                JOIN property_dates pd ON m.property_id = pd.property_id
+                WHERE m.date > pd.max_date - %(full)s
+                GROUP BY m.property_id, pd.max_date
+            """, {
+                'account_id': account_id,
+                'half': HALF_ANALYSIS_WINDOW,
+                'full': ANALYSIS_WINDOW_DAYS
+            })
             
-            # 🔐 BATCH QUERY: Anchored MAX(date) per property
-            self.cursor.execute(f"""
+            return {
+                row['property_id']: {
+                    'data_through': row['data_through'],
+                    'last_7_clicks': int(row['last_7_clicks']),
+                    'last_7_impressions': int(row['last_7_impressions']),
+                    'prev_7_clicks': int(row['prev_7_clicks']),
+                    'prev_7_impressions': int(row['prev_7_impressions'])
+                }
+                for row in self.cursor.fetchall()
+            }
+        
+        except psycopg2.Error as e:
+            print(f"[ERROR] Failed to fetch property window totals for account {account_id}: {e}")
+            raise RuntimeError(f"Database error fetching property window totals: {e}") from e
+
+    def compute_impression_deltas(self, account_id: str) -> Dict[str, Dict[str, int]]:
+        """
+        Sum last_7 / prev_7 impressions per property in one aggregate query.
+        Windows are anchored to each property's MAX(date), matching
+        split_rows_by_window (0-6 days ago vs 7-13 days ago).
+        
+        Args:
+            account_id: UUID of the account
+            
+        Returns:
+            Dict mapping property_id -> {'prev_7_impressions', 'last_7_impressions'}.
+            Properties with no metrics are absent.
+        """
+        if not self.connection or not self.cursor:
+            raise RuntimeError("Database connection not established")
+        
+        try:
+            # 🔐 BATCH QUERY: one row per property instead of the full 14-day window
+            # MAX(date) per property first, so only the 14-day window is read
+            # from each property's index range rather than its whole history
+            self.cursor.execute("""
                 WITH property_dates AS (
-                    SELECT property_id, MAX(date) as max_date
+                    SELECT m.property_id, MAX(m.date) AS max_date
                     FROM property_daily_metrics m
                     JOIN properties p ON m.property_id = p.id
-                    WHERE p.account_id = %s
-                    GROUP BY property_id
+                    WHERE p.account_id = %(account_id)s
+                    GROUP BY m.property_id
                 )
                 SELECT 
                     m.property_id,
-                    m.date,
-                    m.clicks,
-                    m.impressions,
-                    m.ctr,
-                    m.position
+                    COALESCE(SUM(m.impressions) FILTER (
+                        WHERE m.date > pd.max_date - %(half)s
+                    ), 0) AS last_7_impressions,
+                    COALESCE(SUM(m.impressions) FILTER (
+                        WHERE m.date <= pd.max_date - %(half)s
+                    ), 0) AS prev_7_impressions
                 FROM property_daily_metrics m
                 JOIN property_dates pd ON m.property_id = pd.property_id
-                WHERE m.date >= (pd.max_date - (%s * INTERVAL '1 day'))
-                ORDER BY m.property_id, m.date DESC
-            """, (account_id, lookback_days))
+                WHERE m.date > pd.max_date - %(full)s
+                GROUP BY m.property_id
+            """, {
+                'account_id': account_id,
+                'half': HALF_ANALYSIS_WINDOW,
+                'full': ANALYSIS_WINDOW_DAYS
+            })
             
-            metrics = self.cursor.fetchall()
-            return [dict(row) for row in metrics]
+            return {
+                row['property_id']: {
+                    'prev_7_impressions': int(row['prev_7_impressions']),
+                    'last_7_impressions': int(row['last_7_impressions'])
+                }
+                for row in self.cursor.fetchall()
+            }
         
         except psycopg2.Error as e:
-            print(f"[ERROR] Failed to batch fetch property metrics for account {account_id}: {e}")
-            raise RuntimeError(f"Database error batch fetching metrics: {e}") from e
+            print(f"[ERROR] Failed to compute impression deltas for account {account_id}: {e}")
+            raise RuntimeError(f"Database error computing impression deltas: {e}") from e
 
 
     def fetch_recent_alert(
@@ -1146,15 +1790,9 @@ class DatabasePersistence:
             raise RuntimeError("Database connection not established")
             
         try:
-            self.cursor.execute("""
-                SELECT id, triggered_at 
-                FROM alerts 
-                WHERE account_id = %s 
-                  AND property_id = %s 
-                  AND alert_type = %s 
-                  AND triggered_at >= NOW() - (%s * INTERVAL '1 hour')
-                LIMIT 1
-            """, (account_id, property_id, alert_type, within_hours))
+            self._execute_prepared(
+                'fetch_recent_alert', (account_id, property_id, alert_type, within_hours)
+            )
             
             return self.cursor.fetchone()
         except psycopg2.Error as e:
@@ -1166,40 +1804,60 @@ class DatabasePersistence:
     # ALERT METHODS (Email Alerting)
     # =========================================================================
 
-    def insert_alert(
-        self, 
-        account_id: str,
-        property_id: str, 
-        alert_type: str,
-        prev_7_impressions: int,
-        last_7_impressions: int,
-        delta_pct: float
-    ) -> str:
+    def insert_alerts_bulk(self, alerts: List[Dict[str, Any]]) -> List[str]:
         """
-        Insert a scoped alert into the alerts table.
+        Insert many scoped alerts with a single multi-row INSERT.
+        
+        Args:
+            alerts: List of dicts with keys: account_id, property_id, alert_type,
+                    prev_7_impressions, last_7_impressions, delta_pct
+        
+        Returns:
+            List of new alert UUIDs
         """
+        if not alerts:
+            return []
+        
         if not self.connection or not self.cursor:
             raise RuntimeError("Database connection not established")
         
+        rows = [
+            (
+                alert['account_id'],
+                alert['property_id'],
+                alert['alert_type'],
+                alert['prev_7_impressions'],
+                alert['last_7_impressions'],
+                alert['delta_pct']
+            )
+            for alert in alerts
+        ]
+        
         try:
-            self.cursor.execute("""
+            results = execute_values(self.cursor, """
                 INSERT INTO alerts 
                     (account_id, property_id, alert_type, prev_7_impressions, last_7_impressions, 
                      delta_pct, triggered_at, email_sent)
-                VALUES (%s, %s, %s, %s, %s, %s, NOW(), false)
+                VALUES %s
                 RETURNING id
-            """, (account_id, property_id, alert_type, prev_7_impressions, last_7_impressions, delta_pct))
+            """, rows, template="(%s, %s, %s, %s, %s, %s, NOW(), false)", fetch=True)
             
-            result = self.cursor.fetchone()
             self.connection.commit()
-            return result['id']
+            return [row['id'] for row in results]
         except psycopg2.Error as e:
             self.connection.rollback()
-            print(f"[ERROR] Failed to insert alert: {e}")
-            raise RuntimeError(f"Database error inserting alert: {e}") from e
+            print(f"[ERROR] Failed to insert {len(rows)} alerts: {e}")
+            raise RuntimeError(f"Database error inserting alerts: {e}") from e
 
     def fetch_alert_recipients(self, account_id: str) -> List[str]:
-        """Fetch alert recipients for a specific account."""
+        """
+        Fetch alert recipients for a specific account.
+        Cached for _LOOKUP_CACHE_TTL_SECONDS; add/remove invalidate the entry.
+        """
+        cached = _cache_get(_recipients_cache, account_id)
+        if cached is not None:
+            return list(cached)
+        
         if not self.connection or not self.cursor:
             raise RuntimeError("Database connection not established")
         
@@ -1211,8 +1869,9 @@ class DatabasePersistence:
                 ORDER BY created_at
             """, (account_id,))
             
-            recipients = self.cursor.fetchall()
-            return [row['email'] for row in recipients]
+            recipients = [row['email'] for row in self.cursor.fetchall()]
+            _cache_put(_recipients_cache, account_id, recipients)
+            return list(recipients)
         except psycopg2.Error as e:
             print(f"[ERROR] Failed to fetch recipients for account {account_id}: {e}")
             raise RuntimeError(f"Database error fetching alert recipients: {e}") from e
@@ -1229,6 +1888,7 @@ class DatabasePersistence:
                 ON CONFLICT (account_id, email) DO NOTHING
             """, (account_id, email))
             self.connection.commit()
+            _cache_invalidate(_recipients_cache, account_id)
         except psycopg2.Error as e:
             print(f"[ERROR] Failed to add recipient {email} for account {account_id}: {e}")
             raise RuntimeError(f"Database error adding alert recipient: {e}") from e
@@ -1244,6 +1904,7 @@ class DatabasePersistence:
                 WHERE account_id = %s AND email = %s
             """, (account_id, email))
             self.connection.commit()
+            _cache_invalidate(_recipients_cache, account_id)
         except psycopg2.Error as e:
             print(f"[ERROR] Failed to remove recipient {email} for account {account_id}: {e}")
             raise RuntimeError(f"Database error removing alert recipient: {e}") from e
@@ -1253,32 +1914,38 @@ class DatabasePersistence:
     # ALERT SUBSCRIPTIONS (Property-Level Routing)
     # =========================================================================
 
-    def fetch_property_subscribers(self, account_id: str, property_id: str) -> List[str]:
+    def fetch_subscribers_for_properties(self, account_id: str, property_ids: List[str]) -> Dict[str, List[str]]:
         """
-        Fetch all email addresses subscribed to alerts for a specific property.
+        Fetch alert subscriber emails for many properties in one query.
 
         Args:
             account_id: UUID of the account
-            property_id: UUID of the property
+            property_ids: UUIDs of the properties
 
         Returns:
-            List of email strings subscribed to this property
+            Dict property_id -> list of subscribed emails
+            (properties without subscribers are absent)
         """
         if not self.connection or not self.cursor:
             raise RuntimeError("Database connection not established")
 
+        if not property_ids:
+            return {}
+
         try:
             self.cursor.execute("""
-                SELECT email
+                SELECT property_id, email
                 FROM alert_subscriptions
-                WHERE account_id = %s AND property_id = %s
-                ORDER BY created_at
-            """, (account_id, property_id))
+                WHERE account_id = %s AND property_id = ANY(%s::uuid[])
+                ORDER BY property_id, created_at
+            """, (account_id, list(property_ids)))
 
-            rows = self.cursor.fetchall()
-            return [row['email'] for row in rows]
+            return {
+                property_id: [row['email'] for row in group]
+                for property_id, group in groupby(self.cursor.fetchall(), key=itemgetter('property_id'))
+            }
         except psycopg2.Error as e:
-            print(f"[ERROR] Failed to fetch subscribers for property {property_id}: {e}")
+            print(f"[ERROR] Failed to fetch subscribers for {len(property_ids)} properties: {e}")
             raise RuntimeError(f"Database error fetching property subscribers: {e}") from e
 
     def add_alert_subscription(self, account_id: str, email: str, property_id: str) -> None:
@@ -1419,31 +2086,35 @@ class DatabasePersistence:
             print(f"[ERROR] Failed to fetch unsent deliveries for alert {alert_id}: {e}")
             raise RuntimeError(f"Database error fetching unsent deliveries: {e}") from e
 
-    def mark_delivery_sent(self, delivery_id: str) -> None:
+    def mark_deliveries_sent(self, delivery_ids: List[str]) -> None:
         """
-        Mark a single delivery record as successfully sent.
+        Mark delivery records as successfully sent in one UPDATE and one commit.
 
         Args:
-            delivery_id: UUID of the alert_deliveries row
+            delivery_ids: UUIDs of the alert_deliveries rows
         """
         if not self.connection or not self.cursor:
             raise RuntimeError("Database connection not established")
 
+        if not delivery_ids:
+            return
+
         try:
             self.cursor.execute("""
                 UPDATE alert_deliveries
                 SET sent = true, sent_at = NOW()
-                WHERE id = %s
-            """, (delivery_id,))
+                WHERE id = ANY(%s::uuid[])
+            """, (list(delivery_ids),))
             self.connection.commit()
         except psycopg2.Error as e:
             self.connection.rollback()
-            print(f"[ERROR] Failed to mark delivery {delivery_id} as sent: {e}")
+            print(f"[ERROR] Failed to mark {len(delivery_ids)} delivery(s) as sent: {e}")
             raise RuntimeError(f"Database error marking delivery sent: {e}") from e
 
-    def mark_delivery_suppressed(self, delivery_id: str) -> None:
+    def mark_deliveries_suppressed(self, delivery_ids: List[str]) -> None:
         """
-        Mark a delivery as suppressed due to per-recipient cooldown.
+        Mark deliveries as suppressed due to per-recipient cooldown,
+        in one UPDATE and one commit.
 
         Sets sent=true and suppressed=true so that:
         - check_if_alert_fully_delivered() still works (no open rows remain)
@@ -1451,21 +2122,24 @@ class DatabasePersistence:
         - The recipient is NOT emailed.
 
         Args:
-            delivery_id: UUID of the alert_deliveries row
+            delivery_ids: UUIDs of the alert_deliveries rows
         """
         if not self.connection or not self.cursor:
             raise RuntimeError("Database connection not established")
 
+        if not delivery_ids:
+            return
+
         try:
             self.cursor.execute("""
                 UPDATE alert_deliveries
                 SET sent = true, suppressed = true, sent_at = NOW()
-                WHERE id = %s
-            """, (delivery_id,))
+                WHERE id = ANY(%s::uuid[])
+            """, (list(delivery_ids),))
             self.connection.commit()
         except psycopg2.Error as e:
             self.connection.rollback()
-            print(f"[ERROR] Failed to mark delivery {delivery_id} as suppressed: {e}")
+            print(f"[ERROR] Failed to mark {len(delivery_ids)} delivery(s) as suppressed: {e}")
             raise RuntimeError(f"Database error marking delivery suppressed: {e}") from e
 
     def is_recipient_in_cooldown(
@@ -1547,28 +2221,31 @@ class DatabasePersistence:
             raise RuntimeError(f"Database error checking alert delivery status: {e}") from e
 
 
-    def mark_alert_email_sent(self, alert_id: str) -> None:
+    def mark_alert_emails_sent(self, alert_ids: List[str]) -> None:
         """
-        Mark an alert as email sent.
+        Mark a batch of alerts as email sent in one UPDATE and one commit.
         
         Args:
-            alert_id: UUID of the alert
+            alert_ids: UUIDs of the alerts
         """
         if not self.connection or not self.cursor:
             raise RuntimeError("Database connection not established")
         
+        if not alert_ids:
+            return
+        
         try:
             self.cursor.execute("""
                 UPDATE alerts
                 SET email_sent = true
-                WHERE id = %s
-            """, (alert_id,))
+                WHERE id = ANY(%s::uuid[])
+            """, (list(alert_ids),))
             
             self.connection.commit()
         
         except psycopg2.Error as e:
             self.connection.rollback()
-            print(f"[ERROR] Failed to mark alert email sent: {e}")
+            print(f"[ERROR] Failed to mark {len(alert_ids)} alert(s) email sent: {e}")
             raise RuntimeError(f"Database error marking alert email sent: {e}") from e
 
 
@@ -1611,38 +2288,6 @@ class DatabasePersistence:
             raise RuntimeError(f"Database error fetching alert details: {e}") from e
 
 
-    def fetch_property_url(self, property_id: str) -> str:
-        """
-        Fetch site_url for a property.
-        
-        Args:
-            property_id: UUID of the property
-        
-        Returns:
-            Site URL string
-        """
-        if not self.connection or not self.cursor:
-            raise RuntimeError("Database connection not established")
-        
-        try:
-            self.cursor.execute("""
-                SELECT site_url
-                FROM properties
-                WHERE id = %s
-            """, (property_id,))
-            
-            result = self.cursor.fetchone()
-            
-            if not result:
-                raise RuntimeError(f"Property not found: {property_id}")
-            
-            return result['site_url']
-        
-        except psycopg2.Error as e:
-            print(f"[ERROR] Failed to fetch property URL: {e}")
-            raise RuntimeError(f"Database error fetching property URL: {e}") from e
-
-
     def fetch_pending_alerts(self, account_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Fetch all alerts where email_sent = false.
@@ -1710,7 +2355,7 @@ class DatabasePersistence:
     # PIPELINE STATE MANAGEMENT
     # ==========================
 
-    def cleanup_stale_runs(self, account_id: str) -> None:
+    def cleanup_stale_runs(self, account_id: Optional[str] = None) -> None:
         """
         Detect and terminate any runs that have been 'is_running' for too long.
         This provides deterministic recovery from server crashes or interruptions.
@@ -1718,35 +2363,39 @@ class DatabasePersistence:
         Dual-tier policy:
         1. Soft Timeout (20m): No heartbeat (updated_at) for 20 minutes.
         2. Hard Timeout (2h): Total runtime (started_at) exceeds 2 hours.
+        
+        With account_id=None every account is swept (used by the API's
+        background reaper). An UPDATE that matches nothing takes no row locks
+        and writes no WAL, so the common no-op sweep is read-only in effect.
         """
+        scope = account_id or "all accounts"
+        account_filter = "AND account_id = %(account_id)s" if account_id else ""
         try:
-            self.cursor.execute("""
-                UPDATE pipeline_runs
-                SET is_running = false,
-                    error = CASE 
-                        WHEN started_at < NOW() - INTERVAL '2 hours' THEN 'Hard timeout exceeded (2h)'
-                        ELSE 'Stale run auto-terminated (no heartbeat)'
-                    END,
-                    completed_at = NOW(),
-                    updated_at = NOW()
-                WHERE account_id = %s 
-                  AND is_running = true 
-                  AND (
-                      updated_at < NOW() - INTERVAL '20 minutes' 
-                      OR started_at < NOW() - INTERVAL '2 hours'
-                  )
-            """, (account_id,))
+            # Notify listeners of each terminated run (one row per run)
+            self.cursor.execute(f"""
+                WITH cleaned AS (
+                    {_CLEANUP_STALE_RUNS_SQL}
+                      {account_filter}
+                    {_PIPELINE_RETURNING}
+                )
+                SELECT pg_notify('pipeline_' || account_id, {_PIPELINE_NOTIFY_PAYLOAD})
+                FROM cleaned
+            """, {'account_id': account_id})
             if self.cursor.rowcount > 0:
-                print(f"[DB] Auto-terminated {self.cursor.rowcount} stale run(s) for account {account_id}")
-                self.connection.commit()
+                print(f"[DB] Auto-terminated {self.cursor.rowcount} stale run(s) for {scope}")
+            self.connection.commit()
         except Exception as e:
             self.connection.rollback()
-            print(f"[ERROR] Failed to cleanup stale runs for {account_id}: {e}")
+            print(f"[ERROR] Failed to cleanup stale runs for {scope}: {e}")
 
     def fetch_pipeline_state(self, account_id: str) -> Optional[Dict[str, Any]]:
-        """Fetch the latest pipeline run state for an account."""
+        """
+        Fetch the latest pipeline run state for an account.
+        
+        Read-only: stale runs are terminated by the API's background reaper
+        (cleanup_stale_runs) and by start_pipeline_run, not on every poll.
+        """
         try:
-            self.cleanup_stale_runs(account_id)
             self.cursor.execute("""
                 SELECT 
                     id, is_running, current_step,
@@ -1787,18 +2436,32 @@ class DatabasePersistence:
         """
         Start a new pipeline run for an account.
         Relies on the unique index 'one_running_pipeline_per_account' for safety.
+        
+        Stale runs are terminated by a writable CTE in the same statement.
+        The INSERT selects from that CTE so the UPDATE is guaranteed to have
+        finished before the new running row is checked against the index.
         """
-        self.cleanup_stale_runs(account_id)
         try:
-            self.cursor.execute("""
+            self.cursor.execute(f"""
+                WITH cleaned AS (
+                    {_CLEANUP_STALE_RUNS_SQL}
+                      AND account_id = %(account_id)s
+                    RETURNING id
+                ),
+                cleaned_count AS (
+                    SELECT COUNT(*) AS n FROM cleaned
+                )
                 INSERT INTO pipeline_runs (account_id, is_running, started_at, updated_at)
-                VALUES (%s, true, NOW(), NOW())
-                RETURNING id
-            """, (account_id,))
+                SELECT %(account_id)s, true, NOW(), NOW()
+                FROM cleaned_count
+                RETURNING id, (SELECT n FROM cleaned_count) AS cleaned_count
+            """, {'account_id': account_id})
             
-            run_id = self.cursor.fetchone()['id']
+            row = self.cursor.fetchone()
             self.connection.commit()
-            return run_id
+            if row['cleaned_count'] > 0:
+                print(f"[DB] Auto-terminated {row['cleaned_count']} stale run(s) for account {account_id}")
+            return row['id']
         except psycopg2.IntegrityError:
             self.connection.rollback()
             raise RuntimeError("Pipeline is already running for this account")
@@ -1812,10 +2475,7 @@ class DatabasePersistence:
         Used by threads to self-terminate if they've been marked stale externally.
         """
         try:
-            self.cursor.execute("""
-                SELECT is_running FROM pipeline_runs
-                WHERE id = %s AND account_id = %s
-            """, (run_id, account_id))
+            self._execute_prepared('is_run_active', (run_id, account_id))
             row = self.cursor.fetchone()
             return bool(row and row['is_running'])
         except Exception as e:
@@ -1832,10 +2492,17 @@ class DatabasePersistence:
         progress_total: Optional[int] = None,
         error: Optional[str] = None,
         completed_at: Optional[datetime] = None
-    ) -> None:
+    ) -> bool:
         """
         Update an existing pipeline run state.
         Strictly enforced atomic update: only updates if is_running is true.
+        
+        The new state is published with pg_notify on pipeline_channel(account_id)
+        in the same statement; listeners receive it when the update commits.
+        
+        Returns:
+            True if the run was still active (and updated), so callers can use
+            one update as both progress report and bail-out check
         """
         try:
             updates = []
@@ -1864,21 +2531,28 @@ class DatabasePersistence:
             
             # ATOMIC GUARD: Only update if the run is still marked as running in the DB
             query = f"""
-                UPDATE pipeline_runs 
-                SET {', '.join(updates)}
-                WHERE id = %s 
-                  AND account_id = %s 
-                  AND is_running = true
+                WITH updated AS (
+                    UPDATE pipeline_runs 
+                    SET {', '.join(updates)}
+                    WHERE id = %s 
+                      AND account_id = %s 
+                      AND is_running = true
+                    {_PIPELINE_RETURNING}
+                )
+                SELECT pg_notify(%s, {_PIPELINE_NOTIFY_PAYLOAD})
+                FROM updated
             """
-            params.extend([run_id, account_id])
+            params.extend([run_id, account_id, pipeline_channel(account_id)])
             
             self.cursor.execute(query, tuple(params))
             
             if self.cursor.rowcount == 0:
                 # This indicates either the run_id doesn't exist or it was already terminated
                 print(f"[WARNING] Pipeline update failed for run {run_id}: Run is no longer active.")
+            updated = self.cursor.rowcount > 0
                 
             self.connection.commit()
+            return updated
         except psycopg2.Error as e:
             self.connection.rollback()
             print(f"[ERROR] Failed to update pipeline state: {e}")
@@ -12,9 +12,12 @@ import json
 from datetime import datetime
 from src.config.date_windows import ANALYSIS_WINDOW_DAYS, HALF_ANALYSIS_WINDOW
 from src.utils.metrics import safe_delta_pct
-from src.utils.windows import get_most_recent_date, split_rows_by_window, aggregate_metrics
+from src.utils.windows import split_rows_by_window, aggregate_metrics
 from src.db_persistence import DatabasePersistence
 
+# Devices reported by GSC, in display order
+DEVICES = ('mobile', 'desktop', 'tablet')
+
 
 class DeviceVisibilityAnalyzer:
     """Analyzes device-level visibility changes using 7v7 metrics"""
@@ -26,37 +29,64 @@ class DeviceVisibilityAnalyzer:
         """Fetch raw daily device metrics from database"""
         return self.db.fetch_device_metrics_for_analysis(account_id, property_id)
     
-    def split_by_device(self, metrics: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
-        """Group raw metrics by device type"""
-        device_groups = {
-            'desktop': [],
-            'mobile': [],
-            'tablet': []
-        }
+    def split_by_device_window(self, metrics: List[Dict[str, Any]]) -> Dict[str, Tuple[List[Dict[str, Any]], List[Dict[str, Any]], date]]:
+        """
+        Group raw metrics by device and split each group into last_7 / prev_7.
+        Relies on the DB ordering (device, date DESC) so each device's most
+        recent date is its first row; no max() pass per device is needed.
         
+        Returns:
+            Dict device -> (last_7 rows, prev_7 rows, most recent date),
+            only for devices that have rows
+        """
+        device_groups = {}
+        latest_dates = {}
+        
+        # device_daily_metrics' CHECK constraint guarantees one of DEVICES,
+        # already lowercased at ingest, so rows are bucketed as-is
         for metric in metrics:
-            device = metric.get('device', '').lower()
-            if device in device_groups:
-                device_groups[device].append(metric)
+            device = metric['device']
+            rows = device_groups.get(device)
+            if rows is not None:
+                rows.append(metric)
+            else:
+                # Rows arrive ordered by device, date DESC: the first row is the anchor
+                device_groups[device] = [metric]
+                latest_dates[device] = metric['date']
         
-        return device_groups
+        windows = {}
+        for device, rows in device_groups.items():
+            # 🟢 Use Centralized Window Logic
+            last_7, prev_7 = split_rows_by_window(rows, latest_dates[device])
+            windows[device] = (last_7, prev_7, latest_dates[device])
+        
+        return windows
 
     
 
-    def analyze_property(self, account_id: str, property_data: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze_property(
+        self,
+        account_id: str,
+        property_data: Dict[str, Any],
+        metrics: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
         """
         Analyze device visibility for a single property using canonical windows.
+        Pass pre-fetched metrics (from a batch read) to skip the per-property query.
         """
         property_id = property_data['id']
         site_url = property_data['site_url']
         base_domain = property_data['base_domain']
         
-        print(f"\n[PROPERTY] {base_domain}")
+        # Log lines are buffered and emitted once per property
+        log_lines = [f"\n[PROPERTY] {base_domain}"]
         
         # Fetch required metrics
-        metrics = self.fetch_analysis_metrics(account_id, property_id)
+        if metrics is None:
+            metrics = self.fetch_analysis_metrics(account_id, property_id)
         
         if not metrics:
+            print(log_lines[0])
             return {
                 'property_id': property_id,
                 'site_url': site_url,
@@ -64,20 +94,17 @@ class DeviceVisibilityAnalyzer:
                 'insufficient_data': True
             }
         
-        # Group by device
-        device_groups = self.split_by_device(metrics)
+        # Group by device and split into 7v7 windows
+        device_windows = self.split_by_device_window(metrics)
         details = {}
         
         # Analyze each device
-        for device in ['mobile', 'desktop', 'tablet']:
-            device_metrics = device_groups[device]
-            
-            if not device_metrics:
+        for device in DEVICES:
+            window = device_windows.get(device)
+            if window is None:
                 continue
             
-            # 🟢 Use Centralized Window Logic
-            most_recent_date = get_most_recent_date(device_metrics)
-            last_7, prev_7 = split_rows_by_window(device_metrics, most_recent_date)
+            last_7, prev_7, _ = window
             
             # 🟢 Use Centralized Aggregation
             last_7_agg = aggregate_metrics(last_7)
@@ -104,10 +131,12 @@ class DeviceVisibilityAnalyzer:
             }
             
             # Log metrics
-            print(f"  [DEVICE] {device}")
-            print(f"    Impressions: {last_7_agg['impressions']:,} ({impressions_delta_pct:+.1f}%)")
-            print(f"    Clicks:      {last_7_agg['clicks']:,} ({clicks_delta_pct:+.1f}%)")
-            print(f"    CTR:         {last_7_agg['ctr']*100:.2f}% ({ctr_delta_pct:+.1f}%)")
+            log_lines.append(f"  [DEVICE] {device}")
+            log_lines.append(f"    Impressions: {last_7_agg['impressions']:,} ({impressions_delta_pct:+.1f}%)")
+            log_lines.append(f"    Clicks:      {last_7_agg['clicks']:,} ({clicks_delta_pct:+.1f}%)")
+            log_lines.append(f"    CTR:         {last_7_agg['ctr']*100:.2f}% ({ctr_delta_pct:+.1f}%)")
+        
+        print("\n".join(log_lines))
         
         return {
             'property_id': property_id,
@@ -125,9 +154,14 @@ class DeviceVisibilityAnalyzer:
         print("DEVICE PERFORMANCE ANALYSIS (CANONICAL 7v7)")
         print("="*80)
         
+        # One batch read for every property instead of a query per property
+        all_metrics = self.db.fetch_device_metrics_for_analysis_bulk(
+            account_id, [prop['id'] for prop in properties]
+        )
+        
         results = []
         for prop in properties:
-            result = self.analyze_property(account_id, prop)
+            result = self.analyze_property(account_id, prop, all_metrics.get(prop['id'], []))
             results.append(result)
         
         # Save to JSON for debugging
@@ -141,8 +175,10 @@ class DeviceVisibilityAnalyzer:
             'comparisons': results
         }
         
+        # Encode in one call and write once; json.dump issues a write per chunk
+        payload = json.dumps(output_data, indent=2)
         with open(output_file, 'w') as f:
-            json.dump(output_data, f, indent=2)
+            f.write(payload)
             
         print(f"\n[DEBUG] JSON saved to: {output_file}")
         return output_data
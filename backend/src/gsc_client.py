@@ -5,16 +5,55 @@ Handles authentication and property discovery for multiple accounts
 """
 
 import datetime
+import threading
 from datetime import timezone
+from functools import lru_cache
 from typing import List, Dict, Any
 from src.db_persistence import DatabasePersistence
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+from googleapiclient.model import JsonModel
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
+import orjson
 
 from src.settings import settings
 from src.auth.token_model import GSCAuthToken
 
+# Search Console calls: per-request socket timeout, and how many times
+# googleapiclient retries 429/5xx/socket errors (exponential backoff)
+GSC_HTTP_TIMEOUT_SECONDS = 30
+GSC_API_RETRIES = 4
+
+# Permission levels that allow reading Search Analytics for a property
+_ALLOWED_PERMISSIONS = frozenset({"siteOwner", "siteFullUser"})
+
+
+class _OrjsonModel(JsonModel):
+    """JsonModel that decodes response bodies with orjson instead of stdlib json"""
+
+    def deserialize(self, content):
+        try:
+            body = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # Non-JSON bodies keep the stock handling
+            return super().deserialize(content)
+        if self._data_wrapper and "data" in body:
+            body = body["data"]
+        return body
+
+
+@lru_cache(maxsize=1)
+def _searchconsole_discovery_doc() -> str:
+    """
+    Bundled searchconsole v1 discovery document, read from disk once per
+    process instead of once per account. Parsed fresh for every service,
+    since googleapiclient fills in method descriptions as it builds.
+    """
+    return discovery_cache.get_static_doc("searchconsole", "v1")
+
 
 class AuthError(Exception):
     """Raised when authentication is invalid or expired and cannot be refreshed"""
@@ -29,6 +68,7 @@ class GSCClient:
         self.account_id = account_id
         self.credentials = self._load_credentials()
         self.service = self._init_service()
+        self._local = threading.local()
 
     def _load_credentials(self) -> Credentials:
         """
@@ -68,7 +108,12 @@ class GSCClient:
 
     def _init_service(self):
         self._refresh_if_expired()
-        return build("searchconsole", "v1", credentials=self.credentials)
+        # One long-lived keep-alive transport (with a timeout) for the main thread
+        return build_from_document(
+            orjson.loads(_searchconsole_discovery_doc()),
+            http=AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=GSC_HTTP_TIMEOUT_SECONDS)),
+            model=_OrjsonModel(data_wrapper=False)
+        )
 
     def _refresh_if_expired(self) -> None:
         if not self.credentials:
@@ -132,6 +177,18 @@ class GSCClient:
                 print(f"  refresh_token present at failure: {self.credentials.refresh_token is not None}")
                 raise AuthError(f"Failed to refresh Google OAuth token: {e}")
 
+    def thread_http(self) -> AuthorizedHttp:
+        """
+        Authorized transport for the calling thread.
+        The service's own httplib2 transport is not thread-safe, so worker
+        threads pass this to request.execute(http=...) instead.
+        """
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=GSC_HTTP_TIMEOUT_SECONDS))
+            self._local.http = http
+        return http
+
     # ============================================================
     # 📊 GSC API METHODS
     # ============================================================
@@ -140,7 +197,7 @@ class GSCClient:
         self._refresh_if_expired()
 
         try:
-            sites_list = self.service.sites().list().execute()
+            sites_list = self.service.sites().list().execute(num_retries=GSC_API_RETRIES)
             properties = sites_list.get("siteEntry", [])
 
             print(
@@ -157,12 +214,10 @@ class GSCClient:
         self, properties: List[Dict[str, Any]]
     ) -> List[Dict[str, Any]]:
 
-        allowed_permissions = {"siteOwner", "siteFullUser"}
-
         filtered = [
             prop
             for prop in properties
-            if prop.get("permissionLevel") in allowed_permissions
+            if prop.get("permissionLevel") in _ALLOWED_PERMISSIONS
         ]
 
         excluded_count = len(properties) - len(filtered)
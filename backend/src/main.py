@@ -8,8 +8,19 @@ CONNECTION DESIGN:
   returns it. The pipeline thread does NOT hold a connection for its full duration.
   This is required because Supabase session-mode pool size = 15 and pipelines
   can run for 30+ minutes.
+
+  A pipeline holds at most 2 pooled connections at once: the ingestion loop's
+  (one property at a time) plus the page analysis worker's, which analyzes
+  each property as soon as it commits. In Phase 2 the bulk device analysis
+  takes the loop's place while that worker drains.
+
+  Session budget (15): API pool 10 (2 pipelines x 2, the rest for requests)
+  + 1 unpooled LISTEN connection; cron pool 3 (its own connection + 1
+  pipeline x 2); alert dispatcher pool 1.
 """
 
+import json
+import time
 from contextlib import contextmanager
 from src.gsc_client import GSCClient, AuthError
 from src.utils.urls import extract_base_domain
@@ -22,9 +33,18 @@ from src.device_visibility_analyzer import DeviceVisibilityAnalyzer
 from src.alert_detector import detect_alerts_for_all_properties
 from datetime import datetime, timedelta
 from src.config.date_windows import GSC_LAG_DAYS, INGESTION_WINDOW_DAYS, DAILY_INGEST_DAYS
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from typing import Optional, List, Dict, Any
 
+# Concurrent GSC fetches (property + device metrics) during ingestion.
+# Also caps in-flight Search Analytics requests; DB writes stay sequential.
+GSC_FETCH_WORKERS = 8
+# Properties per Search Analytics HTTP batch (one property + one device
+# sub-request each); small batches keep the first results arriving early
+GSC_BATCH_PROPERTIES = 25
+# Properties whose page-metric paging starts before their turn to persist
+PAGE_FETCH_LOOKAHEAD = 2
+
 
 def log_step(account_id: str, message: str, level: str = "INFO"):
     """Log with timestamp and account context"""
@@ -70,7 +90,92 @@ def check_bail_out(account_id: str, run_id: str) -> bool:
     return False
 
 
-def run_pipeline(account_id: str, run_id: Optional[str] = None):
+def fetch_rows_batched(
+    client: GSCClient,
+    fetchers: Dict[str, Any],
+    props: List[Dict[str, Any]],
+    start_dates: Dict[str, Any],
+    end_date,
+    futures: Dict[str, Dict[str, Future]]
+) -> None:
+    """
+    Fetch every fetcher's rows for a group of properties in one HTTP batch
+    (multipart POST to /batch) instead of a round trip per request.
+    Each sub-request resolves its own future in futures[kind][prop_id], so one
+    property's API error stays with that property. Sub-requests that fail in
+    the batch are retried on their own through fetch_rows (with backoff),
+    since batch execution does not retry 429/5xx.
+
+    Args:
+        client: GSCClient whose service builds the batch
+        fetchers: kind -> ingestor exposing build_request / rows_from_response / fetch_rows
+        props: Properties in this batch
+        start_dates: property_id -> start of range
+        end_date: End of range
+        futures: kind -> property_id -> Future to resolve with fetch_rows' result
+    """
+    http = client.thread_http()
+    batch = client.service.new_batch_http_request()
+    requests = {}
+    failed = []
+
+    def on_response(request_id, response, exception):
+        kind, prop = requests[request_id]
+        if exception is not None:
+            failed.append((kind, prop))
+            return
+        future = futures[kind][prop['id']]
+        try:
+            future.set_result(fetchers[kind].rows_from_response(prop, start_dates[prop['id']], end_date, response))
+        except Exception as e:
+            future.set_exception(e)
+
+    try:
+        for prop in props:
+            for kind, fetcher in fetchers.items():
+                request_id = f"{kind}:{prop['id']}"
+                requests[request_id] = (kind, prop)
+                batch.add(
+                    fetcher.build_request(prop, start_dates[prop['id']], end_date),
+                    callback=on_response,
+                    request_id=request_id
+                )
+
+        try:
+            batch.execute(http=http)
+        except Exception as e:
+            # The batch POST itself failed: fall back to one request each
+            print(f"[GSC] Batch of {len(requests)} requests failed ({e}), retrying individually")
+            failed = [
+                (kind, prop) for kind, prop in requests.values()
+                if not futures[kind][prop['id']].done()
+            ]
+
+        for kind, prop in failed:
+            future = futures[kind][prop['id']]
+            try:
+                future.set_result(fetchers[kind].fetch_rows(prop, start_dates[prop['id']], end_date, http=http))
+            except Exception as e:
+                future.set_exception(e)
+    finally:
+        # Never leave the ingestion loop waiting on a future nothing will resolve
+        for kind in fetchers:
+            for prop in props:
+                future = futures[kind][prop['id']]
+                if not future.done():
+                    future.set_exception(RuntimeError(f"{kind} metrics fetch did not complete for {prop['site_url']}"))
+
+
+def analyze_page_visibility(account_id: str, prop: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Page visibility analysis for one ingested property, on its own
+    short-lived connection (runs on the analysis worker during Phase 1).
+    """
+    with db_scope() as db:
+        return PageVisibilityAnalyzer(db).analyze_property(account_id, prop)
+
+
+def run_pipeline(account_id: str, run_id: Optional[str] = None, force_refresh: bool = False) -> Optional[Dict[str, Any]]:
     """
     Execute the full GSC analytics pipeline for a specific account.
 
@@ -81,9 +186,17 @@ def run_pipeline(account_id: str, run_id: Optional[str] = None):
     Args:
         account_id: UUID of the account
         run_id:     Optional existing run ID (from API). If None, will create one.
+        force_refresh: Re-fetch daily data even for properties that already
+                    have it (a re-run otherwise skips them)
+
+    Returns:
+        Run summary (also logged as one JSON line) if the pipeline completed,
+        else None
     """
     log_step(account_id, "STARTING PIPELINE RUN", "INFO")
+    started = time.monotonic()
 
+    analysis_pool = None
     try:
         # ====================================================================
         # SETUP & LOCKING (short-lived connection)
@@ -122,10 +235,20 @@ def run_pipeline(account_id: str, run_id: Optional[str] = None):
                     grouped_properties[base_domain] = []
                 grouped_properties[base_domain].append(prop)
 
-            log_step(account_id, "Persisting websites and properties...", "PROGRESS")
-            db.persist_grouped_properties(account_id, grouped_properties)
-
+            # persist_grouped_properties only inserts missing websites/properties
+            # (ON CONFLICT DO NOTHING), so skip it when every one is already stored
             db_properties = db.fetch_all_properties(account_id)
+            known = {(prop['base_domain'], prop['site_url']) for prop in db_properties}
+            if all(
+                (base_domain, prop.get('siteUrl', '')) in known
+                for base_domain, props in grouped_properties.items()
+                for prop in props
+            ):
+                log_step(account_id, "No property changes, skipped persistence", "SUCCESS")
+            else:
+                log_step(account_id, "Persisting websites and properties...", "PROGRESS")
+                db.persist_grouped_properties(account_id, grouped_properties)
+                db_properties = db.fetch_all_properties(account_id)
             log_step(account_id, f"Synced {len(db_properties)} properties", "SUCCESS")
 
             db.update_pipeline_state(
@@ -149,46 +272,129 @@ def run_pipeline(account_id: str, run_id: Optional[str] = None):
         backfill_start = today - timedelta(days=INGESTION_WINDOW_DAYS)
 
         safe_properties = []
+        rows_fetched = {'property': 0, 'page': 0, 'device': 0}
+        # Page analysis of a property only needs its own committed page rows, so
+        # it runs on one worker (own short-lived connection) while ingestion continues
+        analysis_pool = ThreadPoolExecutor(max_workers=1)
+        page_analyses = {}
 
-        for idx, prop in enumerate(db_properties, 1):
-            site_url = prop['site_url']
-            prop_id = prop['id']
-
-            # Bail-out check — acquires and releases its own connection
-            if check_bail_out(account_id, run_id):
-                return
-
-            with db_scope() as db:
-                db.update_pipeline_state(
-                    account_id, run_id,
-                    current_step=f"Processing [{idx}/{len(db_properties)}]: {site_url}",
-                    progress_current=idx - 1
+        # Resolve each property's window up front so API fetches can start early
+        with db_scope() as db:
+            needs_backfill = db.check_needs_backfill_bulk(account_id, [prop['id'] for prop in db_properties])
+            start_dates = {
+                prop['id']: backfill_start if needs_backfill[prop['id']] else daily_start
+                for prop in db_properties
+            }
+            # Daily-mode properties whose window is logged as ingested for all
+            # three metric types (e.g. a same-day re-run) skip their API calls
+            already_ingested = set() if force_refresh else db.fetch_properties_ingested(
+                account_id,
+                [prop_id for prop_id, start in start_dates.items() if start == daily_start],
+                daily_start, daily_end
+            )
+        to_fetch = [prop for prop in db_properties if prop['id'] not in already_ingested]
+
+        # Property- and device-metric API calls need no DB, so they run (batched)
+        # on a thread pool while the loop below persists sequentially on one connection at a time.
+        property_fetcher = PropertyMetricsDailyIngestor(client.service, None)
+        device_fetcher = DeviceMetricsDailyIngestor(client.service, None)
+        page_fetcher = PageMetricsDailyIngestor(client.service, None)
+        fetch_pool = ThreadPoolExecutor(max_workers=GSC_FETCH_WORKERS)
+        # Page producers get their own workers: they block on a bounded queue
+        # until the loop drains them, so they must not starve the fetch pool
+        page_pool = ThreadPoolExecutor(max_workers=PAGE_FETCH_LOOKAHEAD + 1)
+        page_fetches = {}
+        try:
+            # Batched in property order, so the loop's next inputs are first in line.
+            # Futures are resolved by fetch_rows_batched as sub-responses arrive.
+            fetchers = {'property': property_fetcher, 'device': device_fetcher}
+            futures = {kind: {prop['id']: Future() for prop in to_fetch} for kind in fetchers}
+            property_futures = futures['property']
+            device_futures = futures['device']
+            for i in range(0, len(to_fetch), GSC_BATCH_PROPERTIES):
+                fetch_pool.submit(
+                    fetch_rows_batched, client, fetchers,
+                    to_fetch[i:i + GSC_BATCH_PROPERTIES], start_dates, daily_end, futures
                 )
-                needs_backfill = db.check_needs_backfill(account_id, prop_id)
 
-            start_date = backfill_start if needs_backfill else daily_start
-            mode_str = "BACKFILL" if needs_backfill else "DAILY"
-            log_step(account_id, f"Property {idx}/{len(db_properties)}: {site_url} ({mode_str} mode)", "PROGRESS")
+            for idx, prop in enumerate(db_properties, 1):
+                site_url = prop['site_url']
+                prop_id = prop['id']
 
-            try:
-                # Ingestors hold db for the duration of their work then we release.
-                # Each ingestor call is sequential, so only 1 connection at a time.
+                # Keep this property and the next PAGE_FETCH_LOOKAHEAD paging ahead
+                for ahead in db_properties[idx - 1:idx + PAGE_FETCH_LOOKAHEAD]:
+                    if ahead['id'] not in page_fetches and ahead['id'] not in already_ingested:
+                        page_fetches[ahead['id']] = page_fetcher.start_fetch(
+                            ahead, start_dates[ahead['id']], daily_end,
+                            executor=page_pool, http_factory=client.thread_http
+                        )
+
+                # Progress update doubles as the bail-out check: it only applies
+                # while the run is active, so one statement and connection per property
                 with db_scope() as db:
-                    property_ingestor = PropertyMetricsDailyIngestor(client.service, db)
-                    page_ingestor = PageMetricsDailyIngestor(client.service, db)
-                    device_ingestor = DeviceMetricsDailyIngestor(client.service, db)
+                    still_active = db.update_pipeline_state(
+                        account_id, run_id,
+                        current_step=f"Processing [{idx}/{len(db_properties)}]: {site_url}",
+                        progress_current=idx - 1
+                    )
+                if not still_active:
+                    log_step(account_id, f"Bailing out: Run {run_id} is no longer active.", "WARNING")
+                    return
 
-                    property_ingestor.ingest_property(prop, start_date, daily_end)
-                    page_ingestor.ingest_property(prop, start_date, daily_end)
-                    device_ingestor.ingest_property(prop, start_date, daily_end)
+                if prop_id in already_ingested:
+                    safe_properties.append(prop)
+                    page_analyses[prop_id] = analysis_pool.submit(analyze_page_visibility, account_id, prop)
+                    log_step(account_id, f"Property {idx}/{len(db_properties)}: {site_url} already ingested through {daily_end}, skipped", "SUCCESS")
+                    continue
 
-                safe_properties.append(prop)
-                log_step(account_id, f"Finished ingestion for {site_url}", "SUCCESS")
+                start_date = start_dates[prop_id]
+                mode_str = "BACKFILL" if start_date == backfill_start else "DAILY"
+                log_step(account_id, f"Property {idx}/{len(db_properties)}: {site_url} ({mode_str} mode)", "PROGRESS")
 
-            except Exception as e:
-                log_step(account_id, f"Ingestion FAILED for {site_url}: {e}", "ERROR")
-                log_step(account_id, f"Property {site_url} will be skipped during analysis phase", "WARNING")
-                continue
+                try:
+                    # Ingestors hold db for the duration of their work then we release.
+                    # Each ingestor call is sequential, so only 1 connection at a time
+                    # here (plus the analysis worker's: 2 per pipeline).
+                    with db_scope() as db:
+                        property_ingestor = PropertyMetricsDailyIngestor(client.service, db)
+                        page_ingestor = PageMetricsDailyIngestor(client.service, db)
+                        device_ingestor = DeviceMetricsDailyIngestor(client.service, db)
+
+                        # Each ingest is logged only once its own rows have
+                        # committed, so a partial run is re-fetched next time
+                        fetched, property_metrics = property_futures[prop_id].result()
+                        property_counts = property_ingestor.persist_rows(prop, fetched, property_metrics)
+                        db.mark_ingested(prop_id, 'property', (row[1] for row in property_metrics))
+
+                        page_counts = page_ingestor.ingest_property(prop, start_date, daily_end, fetch=page_fetches.pop(prop_id))
+                        db.mark_ingested(prop_id, 'page', page_counts['dates'])
+
+                        fetched, device_metrics = device_futures[prop_id].result()
+                        device_counts = device_ingestor.persist_rows(prop, fetched, device_metrics)
+                        db.mark_ingested(prop_id, 'device', (row[2] for row in device_metrics))
+
+                    rows_fetched['property'] += property_counts['rows_fetched']
+                    rows_fetched['page'] += page_counts['rows_fetched']
+                    rows_fetched['device'] += device_counts['rows_fetched']
+
+                    safe_properties.append(prop)
+                    page_analyses[prop_id] = analysis_pool.submit(analyze_page_visibility, account_id, prop)
+                    log_step(account_id, f"Finished ingestion for {site_url}", "SUCCESS")
+
+                except Exception as e:
+                    # Free the page producer's worker if the failure came before page ingest
+                    unused_fetch = page_fetches.pop(prop_id, None)
+                    if unused_fetch:
+                        unused_fetch.stop.set()
+                    log_step(account_id, f"Ingestion FAILED for {site_url}: {e}", "ERROR")
+                    log_step(account_id, f"Property {site_url} will be skipped during analysis phase", "WARNING")
+                    continue
+        finally:
+            # Drop queued fetches on bail-out or failure; in-flight calls finish on their own
+            for fetch in page_fetches.values():
+                fetch.stop.set()
+            fetch_pool.shutdown(wait=False, cancel_futures=True)
+            page_pool.shutdown(wait=False, cancel_futures=True)
 
         log_step(account_id, f"Ingestion complete. {len(safe_properties)}/{len(db_properties)} properties safe for analysis", "SUCCESS")
 
@@ -206,13 +412,14 @@ def run_pipeline(account_id: str, run_id: Optional[str] = None):
         with db_scope() as db:
             db.update_pipeline_state(account_id, run_id, progress_current=len(db_properties))
 
+        properties_synced = db_properties
         db_properties = safe_properties
 
         # ====================================================================
-        # PHASE 2: SEQUENTIAL ANALYSIS
-        # Previously parallelised with 2 separate connections. Now sequential
-        # with a single shared connection — saves 1 connection per pipeline run
-        # and avoids the risk of running out of pool slots during heavy load.
+        # PHASE 2: ANALYSIS
+        # Page analysis runs per property on the single analysis worker from
+        # Phase 1 on; the bulk device analysis runs here on one connection while
+        # that worker finishes the last properties (at most 2 connections).
         # ====================================================================
 
         log_step(account_id, "PHASE 2: ANALYSIS", "INFO")
@@ -223,13 +430,14 @@ def run_pipeline(account_id: str, run_id: Optional[str] = None):
         with db_scope() as db:
             db.update_pipeline_state(account_id, run_id, current_step="Running visibility analysis")
 
-            analyzer_page = PageVisibilityAnalyzer(db)
-            analyzer_page.analyze_all_properties(db_properties, account_id=account_id)
-
             analyzer_device = DeviceVisibilityAnalyzer(db)
             analyzer_device.analyze_all_properties(db_properties, account_id=account_id)
         # ← connection returned to pool here
 
+        # Page analyses were started as each property finished ingesting
+        page_results = [page_analyses[prop['id']].result() for prop in db_properties]
+        PageVisibilityAnalyzer(None).summarize(db_properties, page_results)
+
         log_step(account_id, "Analysis complete", "SUCCESS")
 
         # ====================================================================
@@ -263,6 +471,22 @@ def run_pipeline(account_id: str, run_id: Optional[str] = None):
 
         log_step(account_id, "PIPELINE COMPLETED SUCCESSFULLY", "SUCCESS")
 
+        # One machine-readable line for log consumers, also returned to callers
+        summary = {
+            'account_id': account_id,
+            'run_id': run_id,
+            'phase': 'completed',
+            'properties': len(properties_synced),
+            'ingested': len(safe_properties) - len(already_ingested),
+            'skipped': len(already_ingested),
+            'failed': len(properties_synced) - len(safe_properties),
+            'rows_fetched': rows_fetched,
+            'alerts_triggered': triggered_count,
+            'duration_s': round(time.monotonic() - started, 1)
+        }
+        print(f"[SUMMARY] {json.dumps(summary, separators=(',', ':'), default=str)}")
+        return summary
+
     except Exception as e:
         log_step(account_id, f"FATAL ERROR in pipeline: {e}", "ERROR")
         try:
@@ -277,6 +501,8 @@ def run_pipeline(account_id: str, run_id: Optional[str] = None):
             log_step(account_id, f"Failed to mark pipeline as failed: {cleanup_err}", "WARNING")
         raise
     finally:
+        if analysis_pool:
+            analysis_pool.shutdown(wait=False, cancel_futures=True)
         log_step(account_id, "PIPELINE THREAD EXITING", "INFO")
 
 
@@ -284,7 +510,7 @@ from src.settings import settings
 
 def main():
     """CLI Entrypoint for testing - runs the first account found in DB"""
-    init_db_pool(settings.DATABASE_URL, minconn=1, maxconn=5)
+    init_db_pool(settings.DATABASE_URL, minconn=1, maxconn=3)
 
     try:
         with db_scope() as db:
@@ -9,9 +9,49 @@ API Cost: ~26 API calls per day (one per property)
 Data: Single day (today-2)
 """
 
+import queue
+import threading
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Optional
 from src.db_persistence import DatabasePersistence
+from src.gsc_client import GSC_API_RETRIES
+
+# Rows per Search Analytics response page
+PAGE_ROW_LIMIT = 25000
+# Rows transformed and handed to the DB per persist call
+PAGE_PERSIST_CHUNK_ROWS = 1000
+# Response pages fetched ahead of the DB writer
+PAGE_PREFETCH_PAGES = 2
+
+
+class PageFetch:
+    """
+    One property's page-metric responses, paged through by a producer while
+    the consumer writes them. Queue items are row lists, then None when done,
+    or the exception that stopped the producer.
+    """
+    
+    def __init__(self):
+        self.pages = queue.Queue(maxsize=PAGE_PREFETCH_PAGES)
+        self.stop = threading.Event()
+        self.started = threading.Event()
+        self.done = threading.Event()
+    
+    def put(self, item) -> bool:
+        """Producer side: enqueue unless the consumer has closed the fetch."""
+        while not self.stop.is_set():
+            try:
+                self.pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def close(self) -> None:
+        """Stop the producer and wait for it, if it ever started."""
+        self.stop.set()
+        if self.started.is_set():
+            self.done.wait()
 
 
 class PageMetricsDailyIngestor:
@@ -21,7 +61,44 @@ class PageMetricsDailyIngestor:
         self.service = gsc_service
         self.db = db
     
-    def ingest_property(self, property_data: Dict[str, Any], start_date: datetime.date, end_date: datetime.date) -> Dict[str, int]:
+    def start_fetch(
+        self,
+        property_data: Dict[str, Any],
+        start_date: datetime.date,
+        end_date: datetime.date,
+        executor=None,
+        http_factory: Optional[Callable[[], Any]] = None
+    ) -> PageFetch:
+        """
+        Start paging through a property's page metrics ahead of ingest_property.
+        No DB access, so it can run before the property's turn to persist.
+        
+        Args:
+            property_data: Dict with 'id', 'site_url'
+            start_date: Start of range
+            end_date: End of range
+            executor: Optional executor to run the producer on (default: own thread)
+            http_factory: Optional callable returning the producer thread's own
+                AuthorizedHttp (httplib2 is not thread-safe)
+        
+        Returns:
+            PageFetch to hand to ingest_property
+        """
+        fetch = PageFetch()
+        args = (property_data['site_url'], start_date.isoformat(), end_date.isoformat(), fetch, http_factory)
+        if executor is None:
+            threading.Thread(target=self._fetch_pages, args=args, daemon=True).start()
+        else:
+            executor.submit(self._fetch_pages, *args)
+        return fetch
+    
+    def ingest_property(
+        self,
+        property_data: Dict[str, Any],
+        start_date: datetime.date,
+        end_date: datetime.date,
+        fetch: Optional[PageFetch] = None
+    ) -> Dict[str, int]:
         """
         Fetch page metrics for a date range for a single property with pagination.
         
@@ -29,9 +106,12 @@ class PageMetricsDailyIngestor:
             property_data: Dict with 'id', 'site_url', 'base_domain'
             start_date: Start of range
             end_date: End of range
+            fetch: PageFetch from start_fetch for this property and range;
+                started here (on its own thread) if not given
         
         Returns:
-            Dict with 'rows_fetched', 'rows_processed'
+            Dict with 'rows_fetched', 'rows_processed', and 'dates' (the days
+            GSC returned rows for, for mark_ingested)
         """
         property_id = property_data['id']
         site_url = property_data['site_url']
@@ -41,75 +121,115 @@ class PageMetricsDailyIngestor:
         
         total_fetched = 0
         total_processed = 0
-        start_row = 0
-        row_limit = 25000
+        dates = set()
+        
+        # The producer pages through the API while this thread writes the
+        # previous page; the bounded queue caps how many pages sit in memory
+        if fetch is None:
+            fetch = self.start_fetch(property_data, start_date, end_date)
         
         try:
             while True:
-                # Build Search Analytics API request with pagination
-                request_body = {
-                    'startDate': start_date.strftime('%Y-%m-%d'),
-                    'endDate': end_date.strftime('%Y-%m-%d'),
-                    'dimensions': ['page', 'date'],
-                    'rowLimit': row_limit,
-                    'startRow': start_row
-                }
-                
-                # Execute API call
-                response = self.service.searchanalytics().query(
-                    siteUrl=site_url,
-                    body=request_body
-                ).execute()
+                rows = fetch.pages.get()
+                if rows is None:
+                    break
+                if isinstance(rows, Exception):
+                    raise rows
                 
-                rows = response.get('rows', [])
                 batch_size = len(rows)
                 total_fetched += batch_size
                 
                 print(f"  -> Fetched batch: {batch_size} rows (total: {total_fetched})")
                 
                 if not rows:
-                    break
+                    continue
                 
-                # Transform API response to database format
-                page_metrics = []
+                # Transform into insert-ready tuples and flush every
+                # PAGE_PERSIST_CHUNK_ROWS, so at most one chunk is buffered
+                self.db.begin_transaction(synchronous_commit=False)
+                buffer = []
                 for row in rows:
                     keys = row.get('keys', [])
                     if len(keys) != 2:
                         continue
                     
-                    page_url = keys[0]
-                    date_str = keys[1]
+                    dates.add(keys[1])
+                    buffer.append((
+                        property_id,
+                        keys[0],
+                        keys[1],
+                        row.get('clicks', 0),
+                        row.get('impressions', 0)
+                    ))
                     
-                    page_metrics.append({
-                        'page_url': page_url,
-                        'date': date_str,
-                        'clicks': row.get('clicks', 0),
-                        'impressions': row.get('impressions', 0),
-                        'ctr': row.get('ctr', 0.0),
-                        'position': row.get('position', 0.0)
-                    })
+                    if len(buffer) >= PAGE_PERSIST_CHUNK_ROWS:
+                        total_processed += self.db.persist_page_metrics(property_id, buffer)['rows_processed']
+                        buffer = []
                 
-                # Persist batch to database
-                # Start transaction for this batch
-                self.db.begin_transaction()
-                counts = self.db.persist_page_metrics(property_id, page_metrics, show_progress=False)
+                if buffer:
+                    total_processed += self.db.persist_page_metrics(property_id, buffer)['rows_processed']
                 self.db.commit_transaction()
-                
-                total_processed += counts['rows_processed']
-                
-                # Pagination logic: if we got exactly row_limit, there might be more
-                if batch_size < row_limit:
-                    break
-                
-                start_row += row_limit
             
             print(f"  -> Page metrics finish: {total_fetched} fetched, {total_processed} processed")
             return {
                 'rows_fetched': total_fetched,
-                'rows_processed': total_processed
+                'rows_processed': total_processed,
+                'dates': dates
             }
         
         except Exception as e:
             self.db.rollback_transaction()
             print(f"  ✗ Page metrics error for {site_url}: {e}")
             raise
+        
+        finally:
+            # Stop a producer still paging (e.g. after a DB error) and wait for it
+            fetch.close()
+    
+    def _fetch_pages(
+        self,
+        site_url: str,
+        start_iso: str,
+        end_iso: str,
+        fetch: PageFetch,
+        http_factory: Optional[Callable[[], Any]] = None
+    ) -> None:
+        """
+        Producer for ingest_property: puts each page of API rows on the fetch
+        queue, then None when done. An API error is put on the queue instead.
+        """
+        fetch.started.set()
+        try:
+            http = http_factory() if http_factory else None
+            start_row = 0
+            while not fetch.stop.is_set():
+                # Build Search Analytics API request with pagination
+                request_body = {
+                    'startDate': start_iso,
+                    'endDate': end_iso,
+                    'dimensions': ['page', 'date'],
+                    'rowLimit': PAGE_ROW_LIMIT,
+                    'startRow': start_row
+                }
+                
+                # Execute API call
+                response = self.service.searchanalytics().query(
+                    siteUrl=site_url,
+                    body=request_body
+                ).execute(http=http, num_retries=GSC_API_RETRIES)
+                
+                rows = response.get('rows', [])
+                if not fetch.put(rows):
+                    return
+                
+                # Pagination logic: if we got exactly PAGE_ROW_LIMIT, there might be more
+                if len(rows) < PAGE_ROW_LIMIT:
+                    break
+                
+                start_row += PAGE_ROW_LIMIT
+            
+            fetch.put(None)
+        except Exception as e:
+            fetch.put(e)
+        finally:
+            fetch.done.set()
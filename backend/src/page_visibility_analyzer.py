@@ -18,13 +18,11 @@ Core Logic:
 
 import json
 import os
-from datetime import datetime, timedelta
-from collections import defaultdict
+from datetime import datetime
 from typing import Dict, List, Any, Set, Tuple
 from src.db_persistence import DatabasePersistence
-from src.config.date_windows import ANALYSIS_WINDOW_DAYS, HALF_ANALYSIS_WINDOW
+from src.config.date_windows import ANALYSIS_WINDOW_DAYS
 from src.utils.metrics import safe_delta_pct
-from src.utils.windows import get_most_recent_date, split_rows_by_window, aggregate_metrics
 
 
 class PageVisibilityAnalyzer:
@@ -33,47 +31,6 @@ class PageVisibilityAnalyzer:
     def __init__(self, db: DatabasePersistence):
         self.db = db
     
-    def fetch_analysis_metrics(self, account_id: str, property_id: str) -> List[Dict[str, Any]]:
-        """
-        Fetch page impressions for analysis
-        
-        Args:
-            account_id: UUID of the account
-            property_id: UUID of the property
-        
-        Returns:
-            List of dicts with page_url, date, impressions
-        """
-        return self.db.fetch_page_metrics_for_analysis(account_id, property_id)
-    
-    def build_page_sets(self, rows: List[Dict[str, Any]]) -> Tuple[Set[str], Set[str]]:
-        """
-        Build P_last and P_prev sets using date-based filtering
-        
-        Args:
-            rows: All page-date rows for last 14 days
-        
-        Returns:
-            Tuple of (P_last, P_prev) - sets of page URLs
-        """
-        if not rows:
-            return (set(), set())
-        
-        # Calculate date boundaries
-        most_recent_date = max(row['date'] for row in rows)
-        
-        if not rows:
-            return (set(), set())
-        
-        # 🟢 Use Centralized Window logic
-        most_recent_date = get_most_recent_date(rows)
-        last_rows, prev_rows = split_rows_by_window(rows, most_recent_date)
-        
-        P_last = {row['page_url'] for row in last_rows}
-        P_prev = {row['page_url'] for row in prev_rows}
-        
-        return (P_last, P_prev)
-    
     def classify_pages(self, P_last: Set[str], P_prev: Set[str]) -> Dict[str, Set[str]]:
         """
         Classify pages using set logic
@@ -91,76 +48,26 @@ class PageVisibilityAnalyzer:
             'continuing_pages': P_last & P_prev  # In both
         }
     
-    def aggregate_page_metrics(self, rows: List[Dict[str, Any]], page_url: str, 
-                              start_date: datetime.date, end_date: datetime.date) -> Dict[str, int]:
-        """
-        Aggregate metrics for a single page over a date range
-        
-        Args:
-            rows: All page-date rows
-            page_url: URL to aggregate
-            start_date: Start of range (inclusive)
-            end_date: End of range (inclusive)
-        
-        Returns:
-            Dict with 'impressions' and 'clicks'
-        """
-        # Filter rows for this specific page
-        page_rows = [row for row in rows if row['page_url'] == page_url]
-        
-        # Split into canonical windows using provided dates
-        # Note: We filter by range here to maintain analyzer's specific aggregation needs
-        matching_rows = [
-            row for row in page_rows 
-            if start_date <= row['date'] <= end_date
-        ]
-        
-        # 🟢 Use Centralized Aggregation
-        agg = aggregate_metrics(matching_rows)
-        
-        return {
-            'impressions': agg['impressions'],
-            'clicks': agg['clicks']
-        }
-    
-    def compute_page_deltas(self, rows: List[Dict[str, Any]], continuing_pages: Set[str],
-                           most_recent_date: datetime.date) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    def compute_page_deltas(self, last_sums: Dict[str, Tuple[int, int]], prev_sums: Dict[str, Tuple[int, int]],
+                           continuing_pages: Set[str]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
         """
         Compute metric deltas for continuing pages
         Only returns gains (>=40% impressions) and drops (<=-40% impressions)
         
         Args:
-            rows: All page-date rows
+            last_sums: page_url -> (impressions, clicks) for last_7
+            prev_sums: page_url -> (impressions, clicks) for prev_7
             continuing_pages: Set of page URLs that appear in both windows
-            most_recent_date: Most recent date in dataset
         
         Returns:
             Tuple of (rising, declining) - lists of page dicts
         """
-        # 🟢 Use Centralized Window logic
-        last_rows, prev_rows = split_rows_by_window(rows, most_recent_date)
-        
-        # Optimization: Pre-group metrics by page_url for faster lookup
-        rows_by_page = defaultdict(list)
-        for row in rows:
-            rows_by_page[row['page_url']].append(row)
-            
-        last_7_start = most_recent_date - timedelta(days=HALF_ANALYSIS_WINDOW - 1)
-        prev_7_start = most_recent_date - timedelta(days=ANALYSIS_WINDOW_DAYS - 1)
-        prev_7_end = most_recent_date - timedelta(days=HALF_ANALYSIS_WINDOW)
-        
         rising = []
         declining = []
         
         for page_url in continuing_pages:
-            # Aggregate metrics for both windows
-            last_metrics = self.aggregate_page_metrics(rows, page_url, last_7_start, most_recent_date)
-            prev_metrics = self.aggregate_page_metrics(rows, page_url, prev_7_start, prev_7_end)
-            
-            imps_last = last_metrics['impressions']
-            imps_prev = prev_metrics['impressions']
-            clicks_last = last_metrics['clicks']
-            clicks_prev = prev_metrics['clicks']
+            imps_last, clicks_last = last_sums[page_url]
+            imps_prev, clicks_prev = prev_sums[page_url]
             
             # Compute impression delta
             delta = imps_last - imps_prev
@@ -206,15 +113,18 @@ class PageVisibilityAnalyzer:
         site_url = property_data['site_url']
         base_domain = property_data['base_domain']
         
-        print(f"\n[PROPERTY] {base_domain}")
-        print(f"  Site URL: {site_url}")
+        # Log lines are buffered and emitted once per property, so analysis on
+        # a worker thread does not interleave with the ingestion loop's output
+        log_lines = [f"\n[PROPERTY] {base_domain}", f"  Site URL: {site_url}"]
         
-        # Fetch page metrics for analysis (impressions only)
-        rows = self.fetch_analysis_metrics(account_id, property_id)
+        # Window summary first: insufficient properties skip the per-page query
+        bounds = self.db.fetch_page_window_bounds(account_id, property_id)
+        distinct_days = bounds[1] if bounds else 0
         
         # Safety validation
-        if not rows or len(set(row['date'] for row in rows)) < ANALYSIS_WINDOW_DAYS:
-            print(f"  [WARNING] Insufficient data: only {len(set(row['date'] for row in rows))} days available (need {ANALYSIS_WINDOW_DAYS})")
+        if distinct_days < ANALYSIS_WINDOW_DAYS:
+            log_lines.append(f"  [WARNING] Insufficient data: only {distinct_days} days available (need {ANALYSIS_WINDOW_DAYS})")
+            print("\n".join(log_lines))
             return {
                 'property_id': property_id,
                 'new_pages': [],
@@ -224,11 +134,14 @@ class PageVisibilityAnalyzer:
                 'insufficient_data': True
             }
         
-        print(f"  [DATA] Retrieved {len(rows):,} page-date rows for last 14 days")
+        most_recent_date, _, row_count = bounds
+        log_lines.append(f"  [DATA] {row_count:,} page-date rows for last 14 days")
         
-        # Build sets
-        P_last, P_prev = self.build_page_sets(rows)
-        print(f"  [SETS] P_last: {len(P_last)} unique pages, P_prev: {len(P_prev)} unique pages")
+        # 🟢 Per-page sums for the canonical windows, aggregated in SQL;
+        # their keys are the page sets
+        last_sums, prev_sums = self.db.fetch_page_window_sums(account_id, property_id, most_recent_date)
+        P_last, P_prev = set(last_sums), set(prev_sums)
+        log_lines.append(f"  [SETS] P_last: {len(P_last)} unique pages, P_prev: {len(P_prev)} unique pages")
         
         # Classify pages
         classification = self.classify_pages(P_last, P_prev)
@@ -236,53 +149,46 @@ class PageVisibilityAnalyzer:
         lost_pages_set = classification['lost_pages']
         continuing_pages = classification['continuing_pages']
         
-        print(f"  [CLASSIFICATION]")
-        print(f"    New pages: {len(new_pages_set)}")
-        print(f"    Lost pages: {len(lost_pages_set)}")
-        print(f"    Continuing pages: {len(continuing_pages)}")
-        
-        # Get most recent date for delta computation
-        most_recent_date = max(row['date'] for row in rows)
+        log_lines.append(f"  [CLASSIFICATION]")
+        log_lines.append(f"    New pages: {len(new_pages_set)}")
+        log_lines.append(f"    Lost pages: {len(lost_pages_set)}")
+        log_lines.append(f"    Continuing pages: {len(continuing_pages)}")
         
         # Compute deltas for continuing pages (only gains and drops)
-        gains, drops = self.compute_page_deltas(rows, continuing_pages, most_recent_date)
+        gains, drops = self.compute_page_deltas(last_sums, prev_sums, continuing_pages)
         
-        print(f"    Gains (>=40%): {len(gains)}")
-        print(f"    Drops (<=-40%): {len(drops)}")
+        log_lines.append(f"    Gains (>=40%): {len(gains)}")
+        log_lines.append(f"    Drops (<=-40%): {len(drops)}")
         
         # Build detailed lists for new and lost pages
-        last_7_start = most_recent_date - timedelta(days=6)
-        prev_7_start = most_recent_date - timedelta(days=13)
-        prev_7_end = most_recent_date - timedelta(days=7)
-        
         new_pages = []
         for page_url in new_pages_set:
-            metrics = self.aggregate_page_metrics(rows, page_url, last_7_start, most_recent_date)
+            impressions, clicks = last_sums[page_url]
             new_pages.append({
                 'page_url': page_url,
-                'impressions_last_7': metrics['impressions'],
+                'impressions_last_7': impressions,
                 'impressions_prev_7': 0,
-                'delta': metrics['impressions'],
-                'delta_pct': safe_delta_pct(metrics['impressions'], 0),
-                'clicks_last_7': metrics['clicks'],
+                'delta': impressions,
+                'delta_pct': safe_delta_pct(impressions, 0),
+                'clicks_last_7': clicks,
                 'clicks_prev_7': 0,
-                'clicks_delta': metrics['clicks'],
-                'clicks_delta_pct': safe_delta_pct(metrics['clicks'], 0)
+                'clicks_delta': clicks,
+                'clicks_delta_pct': safe_delta_pct(clicks, 0)
             })
         
         lost_pages = []
         for page_url in lost_pages_set:
-            metrics = self.aggregate_page_metrics(rows, page_url, prev_7_start, prev_7_end)
+            impressions, clicks = prev_sums[page_url]
             lost_pages.append({
                 'page_url': page_url,
                 'impressions_last_7': 0,
-                'impressions_prev_7': metrics['impressions'],
-                'delta': -metrics['impressions'],
-                'delta_pct': safe_delta_pct(0, metrics['impressions']),
+                'impressions_prev_7': impressions,
+                'delta': -impressions,
+                'delta_pct': safe_delta_pct(0, impressions),
                 'clicks_last_7': 0,
-                'clicks_prev_7': metrics['clicks'],
-                'clicks_delta': -metrics['clicks'],
-                'clicks_delta_pct': safe_delta_pct(0, metrics['clicks'])
+                'clicks_prev_7': clicks,
+                'clicks_delta': -clicks,
+                'clicks_delta_pct': safe_delta_pct(0, clicks)
             })
         
         # Sort by impressions (descending)
@@ -293,14 +199,16 @@ class PageVisibilityAnalyzer:
         
         # Log top anomalies
         if lost_pages:
-            print(f"\n  [LOST PAGES] Top 3:")
+            log_lines.append(f"\n  [LOST PAGES] Top 3:")
             for page in lost_pages[:3]:
-                print(f"    {page['page_url']} (was {page['impressions_prev_7']} impressions)")
+                log_lines.append(f"    {page['page_url']} (was {page['impressions_prev_7']} impressions)")
         
         if drops:
-            print(f"\n  [DROPS] Top 3:")
+            log_lines.append(f"\n  [DROPS] Top 3:")
             for page in drops[:3]:
-                print(f"    {page['page_url']}: {page['impressions_prev_7']} → {page['impressions_last_7']} ({page['delta_pct']}%)")
+                log_lines.append(f"    {page['page_url']}: {page['impressions_prev_7']} → {page['impressions_last_7']} ({page['delta_pct']}%)")
+        
+        print("\n".join(log_lines))
         
         return {
             'property_id': property_id,
@@ -330,16 +238,28 @@ class PageVisibilityAnalyzer:
         print(f"Properties to analyze: {len(properties)}")
         print("="*80)
         
-        results = []
+        results = [self.analyze_property(account_id, prop) for prop in properties]
+        return self.summarize(properties, results)
+    
+    def summarize(self, properties: List[Dict[str, Any]], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Print totals and save the debug JSON for per-property results, whether
+        from analyze_all_properties or from analyze_property calls made as each
+        property finished ingesting.
+        
+        Args:
+            properties: Analyzed property dicts, in output order
+            results: analyze_property result for each property
+        
+        Returns:
+            Summary dict with aggregated results
+        """
         total_new = 0
         total_lost = 0
         total_gains = 0
         total_drops = 0
         
-        for prop in properties:
-            result = self.analyze_property(account_id, prop)
-            results.append(result)
-            
+        for result in results:
             if not result['insufficient_data']:
                 total_new += len(result['new_pages'])
                 total_lost += len(result['lost_pages'])
@@ -372,8 +292,10 @@ class PageVisibilityAnalyzer:
             'comparisons': results
         }
         
+        # Encode in one call and write once; json.dump issues a write per chunk
+        payload = json.dumps(output_data, indent=2, default=str)
         with open(output_file, 'w') as f:
-            json.dump(output_data, f, indent=2, default=str)
+            f.write(payload)
         
         print(f"[DEBUG] JSON saved to: {output_file}\n")
         
@@ -10,8 +10,9 @@ Data: Single day (today-2)
 """
 
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
 from src.db_persistence import DatabasePersistence
+from src.gsc_client import GSC_API_RETRIES
 
 
 class PropertyMetricsDailyIngestor:
@@ -33,69 +34,123 @@ class PropertyMetricsDailyIngestor:
         Returns:
             Dict with 'rows_fetched', 'rows_inserted', 'rows_updated'
         """
-        property_id = property_data['id']
-        site_url = property_data['site_url']
-        base_domain = property_data['base_domain']
-        
-        print(f"[INGEST] Property Metrics: {base_domain} ({start_date} to {end_date})")
-        
-        # Build Search Analytics API request
+        rows_fetched, property_metrics = self.fetch_rows(property_data, start_date, end_date)
+        return self.persist_rows(property_data, rows_fetched, property_metrics)
+    
+    def build_request(self, property_data: Dict[str, Any], start_date: datetime.date, end_date: datetime.date):
+        """
+        Unexecuted Search Analytics request for one property's daily rows,
+        for fetch_rows or an HTTP batch (pair the response with rows_from_response).
+        """
         # dimensions=['date'] is CRITICAL for range ingestion to get daily rows
         request_body = {
-            'startDate': start_date.strftime('%Y-%m-%d'),
-            'endDate': end_date.strftime('%Y-%m-%d'),
+            'startDate': start_date.isoformat(),
+            'endDate': end_date.isoformat(),
             'dimensions': ['date'], 
             'rowLimit': 25000
         }
+        return self.service.searchanalytics().query(
+            siteUrl=property_data['site_url'],
+            body=request_body
+        )
+    
+    def fetch_rows(
+        self,
+        property_data: Dict[str, Any],
+        start_date: datetime.date,
+        end_date: datetime.date,
+        http=None
+    ) -> Tuple[int, List[tuple]]:
+        """
+        Call the Search Analytics API and transform the response. No DB access,
+        so this is safe to run on a worker thread.
         
+        Args:
+            property_data: Dict with 'id', 'site_url', 'base_domain'
+            start_date: Start of range
+            end_date: End of range
+            http: Optional per-thread AuthorizedHttp (httplib2 is not thread-safe)
+        
+        Returns:
+            (rows returned by GSC, property_daily_metrics row tuples:
+             property_id, date, clicks, impressions, ctr, position)
+        """
         try:
             # Execute API call
-            response = self.service.searchanalytics().query(
-                siteUrl=site_url,
-                body=request_body
-            ).execute()
-            
-            rows = response.get('rows', [])
-            print(f"  -> GSC returned {len(rows)} daily rows")
-            
-            if not rows:
-                return {
-                    'rows_fetched': 0,
-                    'rows_inserted': 0,
-                    'rows_updated': 0
-                }
-            
-            total_inserted = 0
-            total_updated = 0
-            
-            # Transform API response to database format
-            property_metrics = []
-            for row in rows:
-                # keys[0] is the date string
-                row_date = row['keys'][0]
-                
-                property_metrics.append({
-                    'date': row_date,
-                    'clicks': row.get('clicks', 0),
-                    'impressions': row.get('impressions', 0),
-                    'ctr': row.get('ctr', 0.0),
-                    'position': row.get('position', 0.0)
-                })
-
+            response = self.build_request(property_data, start_date, end_date).execute(
+                http=http, num_retries=GSC_API_RETRIES
+            )
+        except Exception as e:
+            print(f"  ✗ Property metrics error for {property_data['site_url']}: {e}")
+            raise
+        
+        return self.rows_from_response(property_data, start_date, end_date, response)
+    
+    def rows_from_response(
+        self,
+        property_data: Dict[str, Any],
+        start_date: datetime.date,
+        end_date: datetime.date,
+        response: Dict[str, Any]
+    ) -> Tuple[int, List[tuple]]:
+        """Transform a build_request response into fetch_rows' return value"""
+        property_id = property_data['id']
+        base_domain = property_data['base_domain']
+        
+        rows = response.get('rows', [])
+        # One line per property: worker threads would otherwise interleave two
+        print(f"[INGEST] Property Metrics: {base_domain} ({start_date} to {end_date}) -> GSC returned {len(rows)} daily rows")
+        
+        # Transform API response straight into insert-ready row tuples
+        # (keys[0] is the date string)
+        property_metrics = [
+            (
+                property_id,
+                row['keys'][0],
+                row.get('clicks', 0),
+                row.get('impressions', 0),
+                row.get('ctr', 0.0),
+                row.get('position', 0.0)
+            )
+            for row in rows
+        ]
+        
+        return len(rows), property_metrics
+    
+    def persist_rows(self, property_data: Dict[str, Any], rows_fetched: int, property_metrics: List[tuple]) -> Dict[str, int]:
+        """
+        Persist fetched property metrics for one property in its own transaction.
+        
+        Args:
+            property_data: Dict with 'id', 'site_url'
+            rows_fetched: Number of rows GSC returned
+            property_metrics: Output of fetch_rows
+        
+        Returns:
+            Dict with 'rows_fetched', 'rows_inserted', 'rows_updated'
+        """
+        if not rows_fetched:
+            return {
+                'rows_fetched': 0,
+                'rows_inserted': 0,
+                'rows_updated': 0
+            }
+        
+        try:
             # Persist to database
-            self.db.begin_transaction()
-            counts = self.db.persist_property_metrics(property_id, property_metrics)
+            self.db.begin_transaction(synchronous_commit=False)
+            counts = self.db.persist_property_metrics(property_data['id'], property_metrics)
             self.db.commit_transaction()
             
             print(f"  -> Property metrics finish: {counts['inserted']} inserted, {counts['updated']} updated")
             
             return {
-                'rows_fetched': len(rows),
+                'rows_fetched': rows_fetched,
                 'rows_inserted': counts['inserted'],
                 'rows_updated': counts['updated']
             }
         
         except Exception as e:
             self.db.rollback_transaction()
-            print(f"  ✗ Property metrics error for {site_url}: {e}")
+            print(f"  ✗ Property metrics error for {property_data['site_url']}: {e}")
             raise
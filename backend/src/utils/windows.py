@@ -5,6 +5,7 @@ Handles date anchoring, split/aggregation, and canonical windows for consistent
 """
 
 from datetime import date, timedelta
+from types import MappingProxyType
 from typing import Dict, List, Any, Tuple
 from src.config.date_windows import ANALYSIS_WINDOW_DAYS, HALF_ANALYSIS_WINDOW
 
@@ -25,9 +26,11 @@ def split_rows_by_window(rows: List[Dict[str, Any]], most_recent_date: date) ->
     window_size = HALF_ANALYSIS_WINDOW
     total_window = ANALYSIS_WINDOW_DAYS
     
+    # Integer ordinals instead of a timedelta per row
+    anchor = most_recent_date.toordinal()
+    
     for row in rows:
-        row_date = row['date']
-        days_ago = (most_recent_date - row_date).days
+        days_ago = anchor - row['date'].toordinal()
         
         # Last window (e.g. 0-6 days ago)
         if 0 <= days_ago < window_size:
@@ -38,23 +41,41 @@ def split_rows_by_window(rows: List[Dict[str, Any]], most_recent_date: date) ->
             
     return last_window, prev_window
 
+# Result for an empty window, shared read-only instead of rebuilt per call
+_EMPTY_AGGREGATE = MappingProxyType({
+    "clicks": 0,
+    "impressions": 0,
+    "ctr": 0.0,
+    "avg_position": 0.0,
+    "days_with_data": 0
+})
+
 def aggregate_metrics(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     Aggregate clicks, impressions, and position for a window of rows.
     Computes CTR and Avg Position correctly.
+    Empty windows return a shared read-only mapping.
     """
+    if not rows:
+        return _EMPTY_AGGREGATE
+    
     clicks = 0
     impressions = 0
     position_sum = 0.0
     position_days = 0
-    days_with_data = len(set(row['date'] for row in rows))
+    dates = set()
     
+    # Single pass with local accumulators (no per-metric generator re-walks)
     for row in rows:
-        clicks += row.get('clicks', 0) or 0
-        impressions += row.get('impressions', 0) or 0
-        if row.get('position') is not None:
-            position_sum += float(row['position'])
+        dates.add(row['date'])
+        clicks += row.get('clicks') or 0
+        impressions += row.get('impressions') or 0
+        position = row.get('position')
+        if position is not None:
+            position_sum += position
             position_days += 1
+    
+    days_with_data = len(dates)
             
     ctr = (clicks / impressions) if impressions > 0 else 0.0
     avg_position = (position_sum / position_days) if position_days > 0 else 0.0
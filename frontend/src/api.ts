@@ -55,6 +55,13 @@ export const api = {
             fetchJson<PipelineStatus>(`/pipeline/status?account_id=${accountId}`),
         run: (accountId: string) =>
             fetchJson<{ status: string }>(`/pipeline/run?account_id=${accountId}`, { method: 'POST' }),
+        // Pushed state changes (server-sent events); resolves when the run ends
+        streamStatus: (accountId: string, onStatus: (status: PipelineStatus) => void, signal?: AbortSignal) =>
+            apiClient.stream(
+                `/pipeline/events?account_id=${accountId}`,
+                (data) => onStatus(JSON.parse(data) as PipelineStatus),
+                signal
+            ),
     },
 
     websites: {
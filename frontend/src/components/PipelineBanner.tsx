@@ -3,6 +3,9 @@ import api from '../api';
 import { useSession } from '../SessionContext';
 import type { PipelineStatus } from '../types';
 
+// Fallback polling interval when the status stream fails or drops mid-run
+const STATUS_POLL_INTERVAL_MS = 5000;
+
 interface PipelineBannerProps {
     onSuccess?: () => void;
 }
@@ -10,121 +13,126 @@ interface PipelineBannerProps {
 export default function PipelineBanner({ onSuccess }: PipelineBannerProps) {
     const { accountId } = useSession();
     const [status, setStatus] = useState<PipelineStatus | null>(null);
-    const intervalRef = useRef<ReturnType<typeof setInterval> | null>(null);
+    const streamRef = useRef<AbortController | null>(null);
+    const pollRef = useRef<number | null>(null);
     const wasRunning = useRef(false);
     const [stuckInfo, setStuckInfo] = useState(false);
     const onSuccessRef = useRef(onSuccess);
-    const forcePolling = useRef(false);
-    const forceStartTimestamp = useRef<number | null>(null);
 
     useEffect(() => {
         onSuccessRef.current = onSuccess;
     }, [onSuccess]);
 
+    const stopStream = useCallback(() => {
+        if (streamRef.current) {
+            streamRef.current.abort();
+            streamRef.current = null;
+        }
+    }, []);
+
     const stopPolling = useCallback(() => {
-        if (intervalRef.current) {
-            clearInterval(intervalRef.current);
-            intervalRef.current = null;
+        if (pollRef.current !== null) {
+            window.clearInterval(pollRef.current);
+            pollRef.current = null;
         }
     }, []);
 
-    // Define fetchStatus first so it can be used in startPolling
-    // We'll use a functional update pattern or just rely on the fact that startPolling 
-    // will be recreated when fetchStatus changes.
-    const fetchStatus = useCallback(async () => {
-        if (!accountId) return;
-        try {
-            const data = await api.pipeline.getStatus(accountId);
-            setStatus(data);
+    const handleStatus = useCallback((data: PipelineStatus) => {
+        setStatus(data);
 
-            // 1. Handle transitions from running to finished
-            if (wasRunning.current && !data.is_running && !data.error) {
-                if (onSuccessRef.current) onSuccessRef.current();
-            }
-            wasRunning.current = data.is_running;
-
-            // 2. Control polling based on state
-            if (data.is_running) {
-                // startPolling will be defined below, but we can call it here 
-                // because of how useCallback works inside the component scope.
-                // However, to satisfy the linter/TS, we'll defined it properly.
-                _startPolling();
-                forcePolling.current = false;
-                forceStartTimestamp.current = null;
-            } else if (data.error) {
-                stopPolling();
-                forcePolling.current = false;
-                forceStartTimestamp.current = null;
-            } else if (forcePolling.current && forceStartTimestamp.current) {
-                const elapsed = Date.now() - forceStartTimestamp.current;
-                if (elapsed > 60000) {
-                    console.warn('[PIPELINE] Force polling timed out - no run detected.');
-                    forcePolling.current = false;
-                    forceStartTimestamp.current = null;
-                    stopPolling();
-                }
-            } else {
-                stopPolling();
-            }
+        // 1. Handle transitions from running to finished
+        if (wasRunning.current && !data.is_running && !data.error) {
+            if (onSuccessRef.current) onSuccessRef.current();
+        }
+        wasRunning.current = data.is_running;
 
-            // 3. Stuck detection
-            if (data.is_running && data.started_at) {
-                const startTime = new Date(data.started_at).getTime();
-                if (Date.now() - startTime > 3600000) {
-                    setStuckInfo(true);
-                } else {
-                    setStuckInfo(false);
-                }
+        // 2. Stuck detection
+        if (data.is_running && data.started_at) {
+            const startTime = new Date(data.started_at).getTime();
+            if (Date.now() - startTime > 3600000) {
+                setStuckInfo(true);
             } else {
                 setStuckInfo(false);
             }
-        } catch (err) {
-            console.error('Failed to fetch pipeline status:', err);
-            stopPolling();
+        } else {
+            setStuckInfo(false);
         }
-    }, [accountId, stopPolling]);
-    // Note: _startPolling is added to deps later via a separate reference if needed, 
-    // but here we can just use the internal one.
-
-    function _startPolling() {
-        if (intervalRef.current) return;
-        intervalRef.current = setInterval(() => {
-            fetchStatus();
-        }, 15000);
-    }
+    }, []);
 
-    const startPolling = useCallback(_startPolling, [fetchStatus]);
+    // Fallback for a stream that errors or drops while a run is in flight:
+    // poll /pipeline/status until the run ends, so onSuccess still fires
+    const startPolling = useCallback(() => {
+        if (!accountId || pollRef.current !== null) return;
+        pollRef.current = window.setInterval(() => {
+            api.pipeline.getStatus(accountId)
+                .then((data) => {
+                    handleStatus(data);
+                    if (!data.is_running) stopPolling();
+                })
+                .catch((err) => console.error('Failed to fetch pipeline status:', err));
+        }, STATUS_POLL_INTERVAL_MS);
+    }, [accountId, handleStatus, stopPolling]);
+
+    // State changes are pushed by the backend (LISTEN/NOTIFY -> SSE).
+    // The server ends the stream when the run finishes, or after ~60s if
+    // no run starts; polling is only the fallback for a failed stream.
+    const startStream = useCallback(() => {
+        if (!accountId || streamRef.current) return;
+        stopPolling();
+        const controller = new AbortController();
+        streamRef.current = controller;
+
+        api.pipeline.streamStatus(accountId, handleStatus, controller.signal)
+            .then(() => {
+                // Closed before the run was seen finishing (e.g. proxy timeout)
+                if (!controller.signal.aborted && wasRunning.current) startPolling();
+            })
+            .catch((err) => {
+                if (!controller.signal.aborted) {
+                    console.error('Pipeline status stream failed, falling back to polling:', err);
+                    startPolling();
+                }
+            })
+            .finally(() => {
+                if (streamRef.current === controller) streamRef.current = null;
+            });
+    }, [accountId, handleStatus, startPolling, stopPolling]);
 
-    // Update fetchStatus to include startPolling in its scope properly
-    // This is a bit of a dance to avoid circular deps in the hook itself.
     useEffect(() => {
-        if (!accountId) {
-            stopPolling();
-            return;
-        }
+        stopStream();
         stopPolling();
         wasRunning.current = false;
-        forcePolling.current = false;
-        forceStartTimestamp.current = null;
         setStatus(null);
-        fetchStatus();
-    }, [accountId, fetchStatus, stopPolling]);
+        if (!accountId) return;
+
+        // One read on mount; only subscribe if a run is already in flight
+        let cancelled = false;
+        api.pipeline.getStatus(accountId)
+            .then((data) => {
+                if (cancelled) return;
+                handleStatus(data);
+                if (data.is_running) startStream();
+            })
+            .catch((err) => console.error('Failed to fetch pipeline status:', err));
+
+        return () => {
+            cancelled = true;
+        };
+    }, [accountId, handleStatus, startStream, stopStream, stopPolling]);
 
     useEffect(() => {
         const handleStarted = () => {
             console.log('[PIPELINE] Detected pipeline-started event. Waking up banner...');
-            forcePolling.current = true;
-            forceStartTimestamp.current = Date.now();
-            fetchStatus();
-            startPolling();
+            startStream();
         };
 
         window.addEventListener('pipeline-started', handleStarted);
         return () => {
             window.removeEventListener('pipeline-started', handleStarted);
+            stopStream();
             stopPolling();
         };
-    }, [fetchStatus, startPolling, stopPolling]);
+    }, [startStream, stopStream, stopPolling]);
 
     // Don't show if nothing is running or no error
     if (!status || (!status.is_running && !status.error)) return null;
@@ -75,6 +75,49 @@ async function request<T>(path: string, options: RequestInit = {}): Promise<T> {
     return response.json();
 }
 
+/**
+ * Consume a server-sent events endpoint with the same Bearer auth as
+ * request(). EventSource cannot send headers, so the body is read as a
+ * stream and each `data:` line is handed to onData. Resolves when the
+ * server closes the stream.
+ */
+async function stream(path: string, onData: (data: string) => void, signal?: AbortSignal): Promise<void> {
+    const url = buildUrl(path);
+    const token = await getAccessToken();
+
+    const headers: Record<string, string> = { Accept: 'text/event-stream' };
+    if (token) {
+        headers['Authorization'] = `Bearer ${token}`;
+    }
+
+    const response = await fetch(url, { headers, signal });
+
+    if (!response.ok || !response.body) {
+        const text = await response.text();
+        console.error('[API ERROR]', response.status, text);
+        throw new Error(`API Error ${response.status}: ${text}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line; keep any partial tail
+        const events = buffer.split('\n\n');
+        buffer = events.pop() ?? '';
+        for (const event of events) {
+            for (const line of event.split('\n')) {
+                if (line.startsWith('data: ')) onData(line.slice(6));
+            }
+        }
+    }
+}
+
 export const apiClient = {
     get: <T>(path: string) => request<T>(path),
     post: <T>(path: string, body?: unknown) =>
@@ -84,4 +127,5 @@ export const apiClient = {
         }),
     delete: <T>(path: string) =>
         request<T>(path, { method: 'DELETE' }),
+    stream,
 };
\ No newline at end of file